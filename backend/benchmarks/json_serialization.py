@@ -0,0 +1,95 @@
+"""
+Microbenchmark: response serialization of the large admin list endpoints.
+
+Compares FastAPI's default path for a response_model route (validate every
+document into the model, serialize it back, json.dumps in JSONResponse) with
+the trusted path of /admin/appointments and /appointments/my (projected
+documents encoded directly by FastJSONResponse). The gzip cost and size of
+the body are reported too.
+
+Usage (from backend/): python benchmarks/json_serialization.py [appointments] [rounds]
+"""
+import os
+import sys
+import gzip
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from typing import List
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+# server.py reads its configuration at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from server import Appointment, FastJSONResponse, APPOINTMENT_RESPONSE_FIELDS, COMPRESSION_LEVEL
+
+
+def make_appointments(count):
+    """Documents as returned by Mongo with the APPOINTMENT_RESPONSE_FIELDS projection"""
+    start = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+    appointments = []
+    for i in range(count):
+        date_time = start + timedelta(days=i // 12, minutes=30 * (i % 12))
+        doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "user_name": f"Cliente {i}",
+            "user_phone": f"+39333{i:07d}",
+            "hairdresser_id": str(uuid.uuid4()),
+            "hairdresser_name": ["Marco", "Giulia", "Sara"][i % 3],
+            "service_id": str(uuid.uuid4()),
+            "service_name": ["Taglio Uomo", "Piega", "Colore"][i % 3],
+            "date_time": date_time,
+            "status": ["pending", "confirmed", "cancelled"][i % 3],
+            "created_at": date_time - timedelta(days=7),
+        }
+        appointments.append({key: value for key, value in doc.items() if key in APPOINTMENT_RESPONSE_FIELDS})
+    return appointments
+
+
+def fastapi_default(appointments):
+    field = create_response_field("Response_get_all_appointments", List[Appointment])
+    content = asyncio.run(serialize_response(field=field, response_content=appointments))
+    return JSONResponse(content).body
+
+
+def trusted_orjson(appointments):
+    return FastJSONResponse(appointments).body
+
+
+def measure(fn, appointments, rounds):
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        body = fn(appointments)
+    return (time.perf_counter() - started_at) / rounds, body
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    appointments = make_appointments(count)
+
+    print(f"Serializing {count} appointments, {rounds} rounds\n")
+    default_time, default_body = measure(fastapi_default, appointments, rounds)
+    trusted_time, trusted_body = measure(trusted_orjson, appointments, rounds)
+    print(f"  {'response_model + json':24} {default_time * 1000:8.2f} ms  {len(default_body):9} bytes")
+    print(f"  {'trusted + orjson':24} {trusted_time * 1000:8.2f} ms  {len(trusted_body):9} bytes")
+    print(f"  speedup: {default_time / trusted_time:.1f}x")
+    print(f"  identical bodies: {default_body == trusted_body}")
+
+    print()
+    for level in sorted({1, COMPRESSION_LEVEL, 9}):
+        started_at = time.perf_counter()
+        compressed = gzip.compress(trusted_body, compresslevel=level)
+        gzip_time = time.perf_counter() - started_at
+        print(f"  gzip level {level}: {len(trusted_body)} -> {len(compressed)} bytes ({len(compressed) / len(trusted_body):.0%}) in {gzip_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: login throughput and latency of other routes under a login flood.
+
+Floods POST /api/auth/login from many threads while a prober measures the
+latency of GET /api/services and POST /api/availability. With bcrypt on the
+event loop the probe p99 grows to seconds; with the password pool it stays
+close to the idle latency, and excess logins get 503 instead of queueing.
+
+Usage: REACT_APP_BACKEND_URL=https://... python benchmarks/login_flood.py [seconds] [threads]
+"""
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@parrucco.it"
+ADMIN_PASSWORD = "admin123"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def probe_requests():
+    services = requests.get(f"{BASE_URL}/api/services").json()
+    hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+    day = datetime.now() + timedelta(days=3)
+    availability = {
+        "date": day.strftime('%Y-%m-%d'),
+        "service_id": services[0]["id"],
+        "hairdresser_id": hairdressers[0]["id"]
+    }
+    return [
+        lambda session: session.get(f"{BASE_URL}/api/services"),
+        lambda session: session.post(f"{BASE_URL}/api/availability", json=availability),
+    ]
+
+
+def probe(stop, latencies, probes):
+    session = requests.Session()
+    while not stop.is_set():
+        for send in probes:
+            started_at = time.perf_counter()
+            send(session)
+            latencies.append(time.perf_counter() - started_at)
+        time.sleep(0.05)
+
+
+def flood(stop, statuses):
+    session = requests.Session()
+    while not stop.is_set():
+        response = session.post(f"{BASE_URL}/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        statuses.append(response.status_code)
+
+
+def run(seconds, threads):
+    probes = probe_requests()
+    stop = threading.Event()
+    idle, loaded, statuses = [], [], []
+
+    # Idle baseline
+    prober = threading.Thread(target=probe, args=(stop, idle, probes))
+    prober.start()
+    time.sleep(min(seconds, 5))
+    stop.set()
+    prober.join()
+
+    stop.clear()
+    with ThreadPoolExecutor(max_workers=threads + 1) as pool:
+        pool.submit(probe, stop, loaded, probes)
+        for _ in range(threads):
+            pool.submit(flood, stop, statuses)
+        time.sleep(seconds)
+        stop.set()
+
+    ok = statuses.count(200)
+    rejected = statuses.count(503)
+    print(f"Login flood: {threads} threads for {seconds}s against {BASE_URL}\n")
+    print(f"  logins accepted     {ok:6d}  ({ok / seconds:.1f}/s)")
+    print(f"  logins rejected 503 {rejected:6d}")
+    print(f"  other statuses      {len(statuses) - ok - rejected:6d}")
+    for name, values in (("idle", idle), ("under flood", loaded)):
+        print(f"  other routes {name:12} p50 {percentile(values, 0.5) * 1000:7.1f} ms  p99 {percentile(values, 0.99) * 1000:7.1f} ms  ({len(values)} requests)")
+
+
+def main():
+    if not BASE_URL:
+        sys.exit("Set REACT_APP_BACKEND_URL")
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    run(seconds, threads)
+
+
+if __name__ == "__main__":
+    main()
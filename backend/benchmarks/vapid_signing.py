@@ -0,0 +1,105 @@
+"""
+Microbenchmark: VAPID signing cost per push message.
+
+Compares signing a fresh VAPID JWT for every message (what webpush() does when
+given vapid_claims) with the per-origin header cache used by PushClient.
+Encryption of the payload is measured too, since it is the remaining per-message
+cost.
+
+Usage (from backend/): python benchmarks/vapid_signing.py [messages]
+"""
+import os
+import sys
+import time
+import json
+import base64
+from pathlib import Path
+
+from py_vapid import Vapid
+from pywebpush import WebPusher
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+
+# server.py reads its configuration at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from server import VapidHeaderCache, VAPID_TOKEN_LIFETIME_SECONDS, VAPID_REFRESH_MARGIN_SECONDS
+
+# A few push services, as in production (FCM, Mozilla, Apple)
+ENDPOINTS = [
+    "https://fcm.googleapis.com/fcm/send/",
+    "https://updates.push.services.mozilla.com/wpush/v2/",
+    "https://web.push.apple.com/",
+]
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).decode().strip("=")
+
+
+def make_vapid_key():
+    vapid = Vapid()
+    vapid.generate_keys()
+    return b64(vapid.private_key.private_numbers().private_value.to_bytes(32, "big"))
+
+
+def make_subscription(endpoint, index):
+    key = ec.generate_private_key(ec.SECP256R1())
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return {"endpoint": f"{endpoint}{index}", "keys": {"p256dh": b64(public_key), "auth": b64(os.urandom(16))}}
+
+
+def sign_every_message(private_key, subscriptions):
+    for subscription in subscriptions:
+        url = subscription["endpoint"].split("/", 3)
+        Vapid.from_string(private_key=private_key).sign({
+            "sub": "mailto:admin@parrucco.it",
+            "aud": f"{url[0]}//{url[2]}",
+            "exp": int(time.time()) + VAPID_TOKEN_LIFETIME_SECONDS
+        })
+
+
+def cached_headers(private_key, subscriptions):
+    cache = VapidHeaderCache(private_key, "mailto:admin@parrucco.it", VAPID_TOKEN_LIFETIME_SECONDS, VAPID_REFRESH_MARGIN_SECONDS)
+    for subscription in subscriptions:
+        cache.headers_for(subscription["endpoint"])
+    return cache.signatures
+
+
+def encrypt_payloads(subscriptions):
+    data = json.dumps({"title": "📅 Appuntamento tra 1 ora", "body": "Taglio con Marco alle 15:00"}).encode()
+    for subscription in subscriptions:
+        WebPusher(subscription).encode(data, "aes128gcm")
+
+
+def measure(name, fn, *args):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return name, time.perf_counter() - started_at, result
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    private_key = make_vapid_key()
+    subscriptions = [make_subscription(ENDPOINTS[i % len(ENDPOINTS)], i) for i in range(messages)]
+
+    print(f"VAPID signing for {messages} messages to {len(ENDPOINTS)} push services\n")
+    results = [
+        measure("sign per message", sign_every_message, private_key, subscriptions),
+        measure("cached per origin", cached_headers, private_key, subscriptions),
+        measure("payload encryption", encrypt_payloads, subscriptions),
+    ]
+    for name, elapsed, _ in results:
+        print(f"  {name:20} {elapsed * 1000:9.1f} ms  {elapsed / messages * 1e6:8.1f} µs/msg  {messages / elapsed:10.0f} msg/s")
+
+    uncached, cached, encryption = (elapsed for _, elapsed, _ in results)
+    print(f"\n  signatures with cache: {results[1][2]}")
+    print(f"  signing speedup: {uncached / cached:.0f}x")
+    print(f"  messages/s (signing + encryption): {messages / (uncached + encryption):.0f} -> {messages / (cached + encryption):.0f}")
+
+
+if __name__ == "__main__":
+    main()
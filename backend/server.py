@@ -1,21 +1,38 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from passlib.context import CryptContext
 import jwt
+import hashlib
 from contextlib import asynccontextmanager
-from pywebpush import webpush, WebPushException
+from pywebpush import webpush_async, WebPushException
+from py_vapid import Vapid
+from urllib.parse import urlparse
+import aiohttp
 import json
+import orjson
 import asyncio
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import monitoring, UpdateOne, ReplaceOne, IndexModel, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
+import time
+import socket
+import zlib
+from bisect import bisect_left, bisect_right
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,13 +42,51 @@ VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', '')
 VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', '')
 VAPID_EMAIL = os.environ.get('VAPID_EMAIL', 'mailto:admin@parrucco.it')
 
+# MongoDB round-trip accounting (globally and per request, see count_db_round_trips)
+request_round_trips: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("request_round_trips", default=None)
+
+class RoundTripCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.total = 0
+
+    def started(self, event):
+        self.total += 1
+        counter = request_round_trips.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+mongo_round_trips = RoundTripCounter()
+DB_ROUND_TRIP_HEADER = os.environ.get('DB_ROUND_TRIP_HEADER', 'false').lower() == 'true'
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: BSON dates come back as UTC-aware datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[mongo_round_trips])
 db = client[os.environ['DB_NAME']]
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt takes 100-300 ms of CPU per call, so it runs in a bounded thread pool
+# (bcrypt releases the GIL) and never blocks the event loop. Hashes with fewer
+# than BCRYPT_ROUNDS rounds are upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Beyond this many pending hash operations requests get a 503 instead of queueing
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', '32'))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+pending_password_hashes = 0
 
 # JWT settings
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
@@ -39,26 +94,324 @@ JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Web Push delivery
+# All pushes share one aiohttp session, so connections to each push service
+# origin (FCM, Mozilla, Apple...) are kept alive and reused, and at most
+# PUSH_CONCURRENCY sends are in flight at once. Nothing blocks the event loop.
+PUSH_CONCURRENCY = int(os.environ.get('PUSH_CONCURRENCY', '50'))
+PUSH_CONNECTIONS_PER_ORIGIN = int(os.environ.get('PUSH_CONNECTIONS_PER_ORIGIN', '10'))
+PUSH_TIMEOUT_SECONDS = float(os.environ.get('PUSH_TIMEOUT_SECONDS', '10'))
+
+# VAPID authorization headers are signed once per push service origin and
+# reused until VAPID_REFRESH_MARGIN_SECONDS before they expire.
+VAPID_TOKEN_LIFETIME_SECONDS = 12 * 3600  # Push services accept at most 24 hours
+VAPID_REFRESH_MARGIN_SECONDS = 600
+
+class VapidHeaderCache:
+    def __init__(self, private_key: str, subject: str, lifetime_seconds: int, refresh_margin_seconds: int):
+        self.private_key = private_key
+        self.subject = subject
+        self.lifetime_seconds = lifetime_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._vapid: Optional[Vapid] = None
+        # origin -> (headers, exp)
+        self._headers: Dict[str, Tuple[dict, int]] = {}
+        self.signatures = 0
+
+    def _get_vapid(self) -> Vapid:
+        if self._vapid is None:
+            if not self.private_key:
+                raise WebPushException("VAPID_PRIVATE_KEY non configurata")
+            if os.path.isfile(self.private_key):
+                self._vapid = Vapid.from_file(private_key_file=self.private_key)
+            else:
+                self._vapid = Vapid.from_string(private_key=self.private_key)
+        return self._vapid
+
+    def headers_for(self, endpoint: str) -> dict:
+        """Authorization headers for the push service of the endpoint"""
+        url = urlparse(endpoint)
+        origin = f"{url.scheme}://{url.netloc}"
+        now = int(time.time())
+        cached = self._headers.get(origin)
+        if cached and cached[1] - self.refresh_margin_seconds > now:
+            return cached[0]
+        
+        exp = now + self.lifetime_seconds
+        headers = self._get_vapid().sign({"sub": self.subject, "aud": origin, "exp": exp})
+        self._headers[origin] = (headers, exp)
+        self.signatures += 1
+        return headers
+
+vapid_headers = VapidHeaderCache(VAPID_PRIVATE_KEY, VAPID_EMAIL, VAPID_TOKEN_LIFETIME_SECONDS, VAPID_REFRESH_MARGIN_SECONDS)
+
+class PushClient:
+    def __init__(self, concurrency: int, connections_per_origin: int, timeout_seconds: float):
+        self.concurrency = concurrency
+        self.connections_per_origin = connections_per_origin
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily: a ClientSession must live inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.concurrency,
+                    limit_per_host=self.connections_per_origin,
+                    keepalive_timeout=60
+                ),
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def send(self, subscription: dict, payload: dict):
+        """Encrypt and deliver one notification; raises WebPushException on failure"""
+        async with self._semaphore:
+            try:
+                # Pre-signed headers instead of vapid_claims: no signature per message
+                await webpush_async(
+                    subscription_info=subscription,
+                    data=json.dumps(payload),
+                    headers=vapid_headers.headers_for(subscription["endpoint"]),
+                    timeout=self.timeout,
+                    aiohttp_session=self._get_session()
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise WebPushException(f"Push failed: {e!r}")
+
+    async def send_many(self, messages: List[Tuple[dict, dict]]) -> List[Optional[Exception]]:
+        """Send (subscription, payload) pairs concurrently; returns the error of each send, or None"""
+        results = await asyncio.gather(
+            *[self.send(subscription, payload) for subscription, payload in messages],
+            return_exceptions=True
+        )
+        return [result if isinstance(result, Exception) else None for result in results]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+push_client = PushClient(PUSH_CONCURRENCY, PUSH_CONNECTIONS_PER_ORIGIN, PUSH_TIMEOUT_SECONDS)
+
+# Scheduler coordination
+# Several processes (uvicorn workers, pods) share the background jobs through
+# leases in db.scheduler_leases. The cleanup runs under a single lease.
+# Notification work is split into NOTIFICATION_PARTITIONS partitions by user
+# hash; live workers (heartbeats in db.scheduler_workers) each claim and renew
+# an equal share of them, so every reminder is handled by exactly one worker.
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', '60'))
+NOTIFICATION_PARTITIONS = 16  # Stored on reminder jobs and queued pushes
+
+def user_partition(user_id: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(user_id.encode()) % NOTIFICATION_PARTITIONS
+
+async def acquire_lease(name: str, seconds: int, fields: Optional[dict] = None) -> bool:
+    """Take or renew a lease; False while another live worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.scheduler_leases.update_one(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=seconds), **(fields or {})}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and belongs to someone else
+        return False
+
+async def claim_notification_partitions() -> List[int]:
+    """Heartbeat, renew the partitions this worker owns and take or give back partitions to get its fair share"""
+    now = datetime.now(timezone.utc)
+    lease_period = timedelta(seconds=SCHEDULER_LEASE_SECONDS)
+    await db.scheduler_workers.update_one({"_id": WORKER_ID}, {"$set": {"heartbeat_at": now}}, upsert=True)
+    live_workers = await db.scheduler_workers.count_documents({"heartbeat_at": {"$gt": now - lease_period}})
+    share = -(-NOTIFICATION_PARTITIONS // max(live_workers, 1))
+    
+    await db.scheduler_leases.update_many(
+        {"owner": WORKER_ID, "kind": "notifications"},
+        {"$set": {"expires_at": now + lease_period}}
+    )
+    leases = await db.scheduler_leases.find(
+        {"kind": "notifications"}, {"_id": 0, "partition": 1, "owner": 1, "expires_at": 1}
+    ).to_list(None)
+    owned = sorted(lease["partition"] for lease in leases if lease["owner"] == WORKER_ID)
+    
+    if len(owned) > share:
+        # New workers joined: hand over the extra partitions
+        await db.scheduler_leases.delete_many({"owner": WORKER_ID, "partition": {"$in": owned[share:]}})
+        owned = owned[:share]
+    elif len(owned) < share:
+        held = set(lease["partition"] for lease in leases if lease["owner"] != WORKER_ID and lease["expires_at"] > now)
+        for partition in range(NOTIFICATION_PARTITIONS):
+            if len(owned) >= share:
+                break
+            if partition in held or partition in owned:
+                continue
+            if await acquire_lease(f"notifications:{partition}", SCHEDULER_LEASE_SECONDS, {"kind": "notifications", "partition": partition}):
+                owned.append(partition)
+    return sorted(owned)
+
+async def renew_notification_leases():
+    """Keep this worker's partitions while a batch runs: a tick may outlast the lease"""
+    while True:
+        await asyncio.sleep(SCHEDULER_LEASE_SECONDS / 3)
+        try:
+            now = datetime.now(timezone.utc)
+            await db.scheduler_leases.update_many(
+                {"owner": WORKER_ID, "kind": "notifications"},
+                {"$set": {"expires_at": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS)}}
+            )
+            await db.scheduler_workers.update_one({"_id": WORKER_ID}, {"$set": {"heartbeat_at": now}}, upsert=True)
+        except Exception as e:
+            logging.error(f"Lease renewal error: {e}")
+
+async def release_scheduler_leases():
+    """Give back every lease on shutdown, so other workers take over right away"""
+    await db.scheduler_leases.delete_many({"owner": WORKER_ID})
+    await db.scheduler_workers.delete_one({"_id": WORKER_ID})
 
 # Notification scheduler task
+# Reminders are materialized in db.reminder_jobs (one per appointment and
+# preference, indexed by due_at) whenever appointments or preferences change.
+# The scheduler sleeps until the next due reminder instead of scanning every
+# user and appointment each minute.
+REMINDER_MAX_SLEEP_SECONDS = int(os.environ.get('REMINDER_MAX_SLEEP_SECONDS', '60'))
+REMINDER_BATCH_SIZE = 500
+# A reminder that could not be sent within this delay (e.g. server down) is dropped
+REMINDER_MAX_LATENESS = timedelta(minutes=1)
+
+# Time windows for each preference (in minutes)
+REMINDER_WINDOWS = {
+    "10min": 10,
+    "30min": 30,
+    "1hour": 60,
+    "2hours": 120,
+    "1day": 1440
+}
+
+# Set when a job is scheduled in this process, so the scheduler re-reads the next due_at
+reminder_wakeup = asyncio.Event()
+
+# Last successful runs of the background loops, for the health checks
+scheduler_state: Dict[str, Any] = {"notifications_at": None, "cleanup_at": None, "partitions": []}
+
 async def notification_scheduler():
-    """Background task that checks appointments and sends notifications"""
+    """Background task that sends reminders when they become due"""
     while True:
+        reminder_wakeup.clear()
+        next_due = None
         try:
-            await check_and_send_notifications()
+            partitions = await claim_notification_partitions()
+            renewal = asyncio.create_task(renew_notification_leases())
+            try:
+                await check_and_send_notifications(partitions)
+            finally:
+                renewal.cancel()
+            next_due = await next_notification_due(partitions)
+            scheduler_state.update(notifications_at=datetime.now(timezone.utc), partitions=partitions)
         except Exception as e:
             logging.error(f"Notification scheduler error: {e}")
-        await asyncio.sleep(60)  # Check every minute
+        
+        # Jobs scheduled by other processes are picked up within REMINDER_MAX_SLEEP_SECONDS;
+        # leases are renewed at least three times per lease period
+        delay = min(REMINDER_MAX_SLEEP_SECONDS, SCHEDULER_LEASE_SECONDS / 3)
+        if next_due is not None:
+            delay = min(delay, max(0, (next_due - datetime.now(timezone.utc)).total_seconds()))
+        try:
+            await asyncio.wait_for(reminder_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+async def next_notification_due(partitions: List[int]) -> Optional[datetime]:
+    """Earliest due reminder or push retry of the given partitions"""
+    if not partitions:
+        return None
+    query = {"partition": {"$in": partitions}}
+    job = await db.reminder_jobs.find_one(query, {"_id": 0, "due_at": 1}, sort=[("due_at", ASCENDING)])
+    item = await db.push_queue.find_one(query, {"_id": 0, "next_attempt_at": 1}, sort=[("next_attempt_at", ASCENDING)])
+    candidates = [doc for doc in [job and job["due_at"], item and item["next_attempt_at"]] if doc]
+    return min(candidates) if candidates else None
+
+async def schedule_reminders(appointments: List[dict]):
+    """(Re)create the reminder jobs of the given appointments from their users' preferences"""
+    if not appointments:
+        return
+    appointment_ids = [apt["id"] for apt in appointments]
+    await db.reminder_jobs.delete_many({"appointment_id": {"$in": appointment_ids}})
+    
+    user_ids = list(set(apt["user_id"] for apt in appointments))
+    users = await db.users.find(
+        {"id": {"$in": user_ids}, "notification_preferences": {"$exists": True, "$ne": []}},
+        {"_id": 0, "id": 1, "notification_preferences": 1}
+    ).to_list(None)
+    prefs_by_user = {user["id"]: user["notification_preferences"] for user in users}
+    
+    now = datetime.now(timezone.utc)
+    jobs = []
+    for apt in appointments:
+        if apt.get("status", "pending") not in ["pending", "confirmed"]:
+            continue
+        apt_time = to_utc(apt["date_time"])
+        for pref in prefs_by_user.get(apt["user_id"], []):
+            if pref not in REMINDER_WINDOWS:
+                continue
+            due_at = apt_time - timedelta(minutes=REMINDER_WINDOWS[pref])
+            if due_at < now - REMINDER_MAX_LATENESS:
+                continue
+            job_id = f"{apt['id']}_{pref}"
+            jobs.append(ReplaceOne({"_id": job_id}, {
+                "_id": job_id,
+                "appointment_id": apt["id"],
+                "user_id": apt["user_id"],
+                "partition": user_partition(apt["user_id"]),
+                "pref": pref,
+                "due_at": due_at
+            }, upsert=True))
+    
+    if jobs:
+        # Upserts keep concurrent reschedules of the same appointment from colliding
+        await db.reminder_jobs.bulk_write(jobs, ordered=False)
+        reminder_wakeup.set()
+
+async def schedule_user_reminders(user_id: str):
+    """Recompute the reminders of a user's upcoming appointments (after a preference change)"""
+    appointments = await db.appointments.find(
+        {"user_id": user_id, "status": {"$in": ["pending", "confirmed"]}, "date_time": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "id": 1, "user_id": 1, "date_time": 1, "status": 1}
+    ).to_list(None)
+    await db.reminder_jobs.delete_many({"user_id": user_id})
+    await schedule_reminders(appointments)
+
+async def cancel_reminders(appointment_ids: List[str]):
+    await db.reminder_jobs.delete_many({"appointment_id": {"$in": appointment_ids}})
 
 # Cleanup scheduler task - eliminates old appointments
+CLEANUP_INTERVAL_SECONDS = 3600
+
 async def cleanup_scheduler():
     """Background task that deletes old appointments (past > 1 week)"""
     while True:
         try:
-            await cleanup_old_appointments()
+            await run_cleanup()
+            scheduler_state["cleanup_at"] = datetime.now(timezone.utc)
         except Exception as e:
             logging.error(f"Cleanup scheduler error: {e}")
-        await asyncio.sleep(3600)  # Check every hour
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)  # Check every hour
+
+async def run_cleanup():
+    # Past days are never queried for availability again (in-memory, every process)
+    appointment_index.prune(datetime.now(timezone.utc).date() - timedelta(days=1))
+    
+    # The database cleanup runs in one process per interval: the lease is kept, not released
+    if await acquire_lease("cleanup", CLEANUP_INTERVAL_SECONDS - 60):
+        await cleanup_old_appointments()
 
 async def cleanup_old_appointments():
     """Delete appointments older than 1 week"""
@@ -66,134 +419,568 @@ async def cleanup_old_appointments():
     
     # Delete past appointments older than 1 week
     result = await db.appointments.delete_many({
-        "date_time": {"$lt": one_week_ago.isoformat()},
+        "date_time": {"$lt": one_week_ago},
         "status": {"$in": ["pending", "confirmed"]}  # Only past appointments, not cancelled (already deleted)
     })
     
     if result.deleted_count > 0:
         logging.info(f"Cleanup: Deleted {result.deleted_count} old appointments (> 1 week)")
     
-    # Also clean up old sent_notifications entries (older than 30 days)
-    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    await db.sent_notifications.delete_many({
-        "sent_at": {"$lt": thirty_days_ago.isoformat()}
-    })
+    # Past claims expire through their TTL index; orphans need a check
+    await release_orphan_claims()
+
+async def check_and_send_notifications(partitions: List[int]):
+    """Queue the reminders that are due, then deliver what the push queue has ready"""
+    if not partitions:
+        return
+    await enqueue_due_reminders(partitions)
+    await process_push_queue(partitions)
 
-async def check_and_send_notifications():
-    """Check upcoming appointments and send notifications based on user preferences"""
+async def enqueue_due_reminders(partitions: List[int]):
+    """Turn due reminder jobs of the given partitions into push queue entries"""
     now = datetime.now(timezone.utc)
     
-    # Time windows for each preference (in minutes)
-    time_windows = {
-        "10min": 10,
-        "30min": 30,
-        "1hour": 60,
-        "2hours": 120,
-        "1day": 1440
-    }
+    jobs = await db.reminder_jobs.find(
+        {"partition": {"$in": partitions}, "due_at": {"$lte": now}}
+    ).sort("due_at", ASCENDING).to_list(REMINDER_BATCH_SIZE)
+    
+    if not jobs:
+        return
     
-    # Get all users with notification preferences and push subscriptions
-    users_cursor = db.users.find(
+    # Batch fetch the appointments of the due jobs
+    appointment_ids = list(set(job["appointment_id"] for job in jobs))
+    appointments = await db.appointments.find(
+        {"id": {"$in": appointment_ids}, "status": {"$in": ["pending", "confirmed"]}},
+        {"_id": 0}
+    ).to_list(None)
+    appointments_by_id = {apt["id"]: apt for apt in appointments}
+    
+    # Check in one query which notifications were already sent
+    sent = await db.sent_notifications.find(
+        {"key": {"$in": [job["_id"] for job in jobs]}},
+        {"_id": 0, "key": 1}
+    ).to_list(None)
+    sent_keys = set(doc["key"] for doc in sent)
+    
+    entries = []
+    for job in jobs:
+        apt = appointments_by_id.get(job["appointment_id"])
+        pref = job["pref"]
+        notification_key = job["_id"]
+        
+        # Appointment gone, reminder too late or already sent: nothing to send
+        if not apt or now - job["due_at"] > REMINDER_MAX_LATENESS or notification_key in sent_keys:
+            continue
+        
+        # Format notification message
+        apt_time = apt["date_time"]
+        time_str = apt_time.strftime("%H:%M")
+        
+        if pref == "10min":
+            title = "⏰ Appuntamento tra 10 minuti!"
+        elif pref == "30min":
+            title = "⏰ Appuntamento tra 30 minuti!"
+        elif pref == "1hour":
+            title = "📅 Appuntamento tra 1 ora"
+        elif pref == "2hours":
+            title = "📅 Appuntamento tra 2 ore"
+        else:
+            title = "📅 Appuntamento domani"
+        
+        body = f"{apt.get('service_name', 'Servizio')} con {apt.get('hairdresser_name', 'Parrucchiere')} alle {time_str}"
+        
+        # A reminder is useless once the appointment has started
+        entries.append(push_queue_entry(job["user_id"], {
+            "title": title,
+            "body": body,
+            "icon": "/logo192.png",
+            "url": "/dashboard"
+        }, notification_key=notification_key, appointment_id=apt["id"], expires_at=apt_time))
+    
+    if await insert_ignoring_duplicates(db.push_queue, entries):
+        reminder_wakeup.set()
+    await db.reminder_jobs.delete_many({"_id": {"$in": [job["_id"] for job in jobs]}})
+
+# Push delivery queue
+# Outgoing notifications are stored in db.push_queue and retried with
+# exponential backoff. Failures are counted per push endpoint in
+# db.push_endpoints: an endpoint answering 404/410, or failing
+# PUSH_ENDPOINT_MAX_FAILURES times in a row, is dead and its subscription is
+# removed from the user.
+PUSH_QUEUE_BATCH_SIZE = 500
+PUSH_MAX_ATTEMPTS = int(os.environ.get('PUSH_MAX_ATTEMPTS', '5'))
+PUSH_RETRY_BASE_SECONDS = int(os.environ.get('PUSH_RETRY_BASE_SECONDS', '30'))
+PUSH_RETRY_MAX_SECONDS = 3600
+PUSH_ENDPOINT_MAX_FAILURES = int(os.environ.get('PUSH_ENDPOINT_MAX_FAILURES', '10'))
+PUSH_DEFAULT_EXPIRATION = timedelta(days=1)
+PUSH_GONE_STATUSES = (404, 410)
+
+def push_queue_entry(
+    user_id: str,
+    payload: dict,
+    notification_key: Optional[str] = None,
+    appointment_id: Optional[str] = None,
+    expires_at: Optional[datetime] = None
+) -> dict:
+    """Queue document; entries with the same notification_key share the same _id and are queued once"""
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": notification_key or str(uuid.uuid4()),
+        "user_id": user_id,
+        "partition": user_partition(user_id),
+        "payload": payload,
+        "notification_key": notification_key,
+        "appointment_id": appointment_id,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "expires_at": expires_at or now + PUSH_DEFAULT_EXPIRATION,
+        "created_at": now
+    }
+
+async def enqueue_push(user_id: str, payload: dict, **options):
+    """Queue a notification for a user"""
+    if await insert_ignoring_duplicates(db.push_queue, [push_queue_entry(user_id, payload, **options)]):
+        reminder_wakeup.set()
+
+async def insert_ignoring_duplicates(collection, documents: List[dict]) -> int:
+    """insert_many that skips documents violating a unique index; returns how many were inserted"""
+    if not documents:
+        return 0
+    try:
+        result = await collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+
+def push_error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a failed push, None for network or encryption errors"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status", getattr(response, "status_code", None))
+
+def push_retry_delay(error: Exception, attempts: int) -> float:
+    """Backoff before the next attempt, honouring Retry-After when the push service sends it"""
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), PUSH_RETRY_MAX_SECONDS)
+    return min(PUSH_RETRY_BASE_SECONDS * 2 ** (attempts - 1), PUSH_RETRY_MAX_SECONDS)
+
+async def record_push_failure(endpoint: str, status_code: Optional[int]) -> bool:
+    """Count a failure for the endpoint; True when the endpoint is dead and was pruned"""
+    tracker = await db.push_endpoints.find_one_and_update(
+        {"_id": endpoint},
         {
-            "notification_preferences": {"$exists": True, "$ne": []},
-            "push_subscription": {"$exists": True}
+            "$inc": {"failures": 1},
+            "$set": {"last_status": status_code, "updated_at": datetime.now(timezone.utc)}
         },
-        {"_id": 0}
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
-    users = await users_cursor.to_list(1000)
+    if status_code not in PUSH_GONE_STATUSES and tracker["failures"] < PUSH_ENDPOINT_MAX_FAILURES:
+        return False
     
-    if not users:
+    result = await db.users.update_many(
+        {"push_subscription.endpoint": endpoint},
+        {"$unset": {"push_subscription": ""}}
+    )
+    await db.push_endpoints.delete_one({"_id": endpoint})
+    logging.info(f"Push endpoint removed after {tracker['failures']} failures (status {status_code}), {result.modified_count} subscriptions pruned")
+    return True
+
+async def process_push_queue(partitions: List[int]):
+    """Deliver the queued notifications of the given partitions whose next attempt is due"""
+    now = datetime.now(timezone.utc)
+    
+    items = await db.push_queue.find(
+        {"partition": {"$in": partitions}, "next_attempt_at": {"$lte": now}}
+    ).sort("next_attempt_at", ASCENDING).to_list(PUSH_QUEUE_BATCH_SIZE)
+    
+    if not items:
         return
     
-    # Collect all user IDs
-    user_ids = [user.get("id") for user in users if user.get("id")]
-    
-    # Batch fetch all upcoming appointments for all users in a single query
-    all_appointments = await db.appointments.find({
-        "user_id": {"$in": user_ids},
-        "status": {"$in": ["pending", "confirmed"]},
-        "date_time": {"$gt": now.isoformat()}
-    }, {"_id": 0}).to_list(10000)
-    
-    # Group appointments by user_id
-    appointments_by_user = {}
-    for apt in all_appointments:
-        uid = apt.get("user_id")
-        if uid not in appointments_by_user:
-            appointments_by_user[uid] = []
-        appointments_by_user[uid].append(apt)
-    
-    for user in users:
-        user_id = user.get("id")
-        prefs = user.get("notification_preferences", [])
-        subscription = user.get("push_subscription")
+    # Subscriptions are read at send time, so a renewed subscription is used right away
+    user_ids = list(set(item["user_id"] for item in items))
+    users = await db.users.find(
+        {"id": {"$in": user_ids}, "push_subscription": {"$exists": True}},
+        {"_id": 0, "id": 1, "push_subscription": 1}
+    ).to_list(None)
+    subscriptions = {user["id"]: user["push_subscription"] for user in users}
+    
+    finished_ids = []
+    outgoing = []
+    for item in items:
+        subscription = subscriptions.get(item["user_id"])
+        # No subscription (unsubscribed or pruned) or expired: drop it
+        if not subscription or item["expires_at"] <= now:
+            finished_ids.append(item["_id"])
+        else:
+            outgoing.append((item, subscription))
+    
+    # Send notifications concurrently
+    errors = await push_client.send_many([(subscription, item["payload"]) for item, subscription in outgoing])
+    
+    retries = []
+    sent_records = []
+    delivered_endpoints = set()
+    dead_endpoints = set()
+    for (item, subscription), error in zip(outgoing, errors):
+        endpoint = subscription.get("endpoint")
+        if error is None:
+            finished_ids.append(item["_id"])
+            delivered_endpoints.add(endpoint)
+            if item.get("notification_key"):
+                sent_records.append({
+                    "key": item["notification_key"],
+                    "sent_at": now,
+                    "user_id": item["user_id"],
+                    "appointment_id": item.get("appointment_id")
+                })
+                logging.info(f"Notification sent: {item['notification_key']}")
+            continue
         
-        if not subscription or not prefs:
+        status_code = push_error_status(error)
+        logging.error(f"Failed to send notification: {error}")
+        if endpoint in dead_endpoints or await record_push_failure(endpoint, status_code):
+            dead_endpoints.add(endpoint)
+            finished_ids.append(item["_id"])
             continue
         
-        # Get user's appointments from pre-fetched data
-        appointments = appointments_by_user.get(user_id, [])
+        attempts = item["attempts"] + 1
+        if attempts >= PUSH_MAX_ATTEMPTS:
+            logging.error(f"Push dropped after {attempts} attempts: {item['_id']}")
+            finished_ids.append(item["_id"])
+            continue
+        retries.append((item["_id"], endpoint, UpdateOne({"_id": item["_id"]}, {"$set": {
+            "attempts": attempts,
+            "next_attempt_at": now + timedelta(seconds=push_retry_delay(error, attempts)),
+            "last_error": str(error)[:500]
+        }})))
+    
+    # Endpoints declared dead later in the batch have nothing left to retry
+    finished_ids += [item_id for item_id, endpoint, _ in retries if endpoint in dead_endpoints]
+    retries = [update for _, endpoint, update in retries if endpoint not in dead_endpoints]
+    # Mark as sent
+    await insert_ignoring_duplicates(db.sent_notifications, sent_records)
+    if retries:
+        await db.push_queue.bulk_write(retries, ordered=False)
+    if finished_ids:
+        await db.push_queue.delete_many({"_id": {"$in": finished_ids}})
+    # A successful delivery resets the endpoint's failure streak
+    if delivered_endpoints:
+        await db.push_endpoints.delete_many({"_id": {"$in": list(delivered_endpoints)}})
+
+# Data migrations
+# Each migration runs once per database: applied names are recorded in
+# db.migrations. Migrations must be idempotent since several workers may
+# start at the same time.
+async def migrate_appointment_end_times():
+    """Store duration_minutes and end_time on appointments created before they were denormalized"""
+    appointments = await db.appointments.find(
+        {"end_time": {"$exists": False}},
+        {"_id": 0, "id": 1, "service_id": 1, "date_time": 1}
+    ).to_list(None)
+    
+    if appointments:
+        services_list = await db.services.find({}, {"_id": 0, "id": 1, "duration_minutes": 1}).to_list(None)
+        durations = {s["id"]: s["duration_minutes"] for s in services_list}
         
+        # Appointments of deleted services keep the historical 30 minute fallback
+        updates = []
         for apt in appointments:
-            apt_time = datetime.fromisoformat(apt["date_time"])
-            if apt_time.tzinfo is None:
-                apt_time = apt_time.replace(tzinfo=timezone.utc)
-            
-            minutes_until = (apt_time - now).total_seconds() / 60
-            
-            for pref in prefs:
-                window = time_windows.get(pref, 0)
-                # Check if we're within 1 minute of the notification time
-                if window - 1 <= minutes_until <= window + 1:
-                    # Check if notification already sent
-                    notification_key = f"{apt['id']}_{pref}"
-                    already_sent = await db.sent_notifications.find_one({"key": notification_key})
-                    
-                    if not already_sent:
-                        # Format notification message
-                        time_str = apt_time.strftime("%H:%M")
-                        date_str = apt_time.strftime("%d/%m/%Y")
-                        
-                        if pref == "10min":
-                            title = "⏰ Appuntamento tra 10 minuti!"
-                        elif pref == "30min":
-                            title = "⏰ Appuntamento tra 30 minuti!"
-                        elif pref == "1hour":
-                            title = "📅 Appuntamento tra 1 ora"
-                        elif pref == "2hours":
-                            title = "📅 Appuntamento tra 2 ore"
-                        else:
-                            title = "📅 Appuntamento domani"
-                        
-                        body = f"{apt.get('service_name', 'Servizio')} con {apt.get('hairdresser_name', 'Parrucchiere')} alle {time_str}"
-                        
-                        # Send notification
-                        try:
-                            webpush(
-                                subscription_info=subscription,
-                                data=json.dumps({
-                                    "title": title,
-                                    "body": body,
-                                    "icon": "/logo192.png",
-                                    "url": "/dashboard"
-                                }),
-                                vapid_private_key=VAPID_PRIVATE_KEY,
-                                vapid_claims={"sub": VAPID_EMAIL}
-                            )
-                            # Mark as sent
-                            await db.sent_notifications.insert_one({
-                                "key": notification_key,
-                                "sent_at": now.isoformat(),
-                                "user_id": user_id,
-                                "appointment_id": apt["id"]
-                            })
-                            logging.info(f"Notification sent: {notification_key}")
-                        except WebPushException as e:
-                            logging.error(f"Failed to send notification: {e}")
+            duration = durations.get(apt["service_id"], DEFAULT_APPOINTMENT_DURATION)
+            start = to_utc(apt["date_time"])
+            updates.append(UpdateOne({"id": apt["id"]}, {"$set": {
+                "duration_minutes": duration,
+                "end_time": (start + timedelta(minutes=duration)).isoformat()
+            }}))
+        await db.appointments.bulk_write(updates, ordered=False)
+        logging.info(f"Migration: backfilled end_time on {len(updates)} appointments")
+    
+    await db.appointments.create_index([("hairdresser_id", 1), ("date_time", 1), ("end_time", 1)])
+
+APPOINTMENT_DATE_FIELDS = ["date_time", "end_time", "created_at"]
+
+async def migrate_appointment_dates_to_bson(batch_size: int = 1000):
+    """Convert the ISO string date fields of appointments to native BSON dates"""
+    cursor = db.appointments.find(
+        {"$or": [{field: {"$type": "string"}} for field in APPOINTMENT_DATE_FIELDS]},
+        {"_id": 1, **{field: 1 for field in APPOINTMENT_DATE_FIELDS}}
+    )
+    converted = 0
+    updates = []
+    async for apt in cursor:
+        updates.append(UpdateOne({"_id": apt["_id"]}, {"$set": {
+            field: to_utc(apt[field]) for field in APPOINTMENT_DATE_FIELDS if isinstance(apt.get(field), str)
+        }}))
+        if len(updates) >= batch_size:
+            await db.appointments.bulk_write(updates, ordered=False)
+            converted += len(updates)
+            updates = []
+    if updates:
+        await db.appointments.bulk_write(updates, ordered=False)
+        converted += len(updates)
+    if converted:
+        logging.info(f"Migration: converted dates of {converted} appointments to BSON")
+
+async def migrate_backfill_slot_claims():
+    """Claim the slots of upcoming appointments booked before slot claims existed"""
+    appointments = await db.appointments.find(
+        {"end_time": {"$gt": datetime.now(timezone.utc)}, "status": {"$ne": "cancelled"}},
+        {"_id": 0, "id": 1, "hairdresser_id": 1, "date_time": 1, "end_time": 1}
+    ).sort("created_at", 1).to_list(None)
+    
+    for apt in appointments:
+        if not await claim_slot(apt["hairdresser_id"], apt["id"], apt["date_time"], apt["end_time"]):
+            # Double booking that predates the claims: keep both, the admin has to move one
+            logging.warning(f"Migration: appointment {apt['id']} overlaps an earlier booking")
 
-# Lifespan
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+async def migrate_backfill_reminder_jobs():
+    """Create the reminder jobs of upcoming appointments booked before the job queue existed"""
+    appointments = await db.appointments.find(
+        {"date_time": {"$gt": datetime.now(timezone.utc)}, "status": {"$in": ["pending", "confirmed"]}},
+        {"_id": 0, "id": 1, "user_id": 1, "date_time": 1, "status": 1}
+    ).to_list(None)
+    for i in range(0, len(appointments), 1000):
+        await schedule_reminders(appointments[i:i + 1000])
+
+async def migrate_sent_notifications():
+    """Convert sent_at to a BSON date (for the TTL index) and drop duplicate keys (for the unique index)"""
+    legacy = await db.sent_notifications.find(
+        {"sent_at": {"$type": "string"}}, {"_id": 1, "sent_at": 1}
+    ).to_list(None)
+    updates = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"sent_at": to_utc(doc["sent_at"])}})
+        for doc in legacy
+    ]
+    for i in range(0, len(updates), 1000):
+        await db.sent_notifications.bulk_write(updates[i:i + 1000], ordered=False)
+    
+    duplicates = await db.sent_notifications.aggregate([
+        {"$group": {"_id": "$key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]).to_list(None)
+    extra_ids = [doc_id for group in duplicates for doc_id in group["ids"][1:]]
+    if extra_ids:
+        await db.sent_notifications.delete_many({"_id": {"$in": extra_ids}})
+    logging.info(f"Migration: {len(updates)} sent_at converted, {len(extra_ids)} duplicate keys removed")
+
+async def migrate_notification_partitions():
+    """Assign the user partition to reminder jobs and queued pushes created before partitioning"""
+    for collection in [db.reminder_jobs, db.push_queue]:
+        docs = await collection.find({"partition": {"$exists": False}}, {"_id": 1, "user_id": 1}).to_list(None)
+        updates = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"partition": user_partition(doc["user_id"])}})
+            for doc in docs
+        ]
+        for i in range(0, len(updates), 1000):
+            await collection.bulk_write(updates[i:i + 1000], ordered=False)
+
+# Complete app_settings document: the migration fills in whatever an older
+# document lacks, so readers never need per-field fallbacks
+SETTINGS_SCHEMA_VERSION = 1
+DEFAULT_TIME_SLOTS = [
+    "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
+    "14:00", "14:30", "15:00", "15:30", "16:00", "16:30",
+    "17:00", "17:30", "18:00"
+]
+DEFAULT_SETTINGS = {
+    "id": "app_settings",
+    "hero_title": "Il Tuo Salone, Sempre Disponibile",
+    "hero_subtitle": "",
+    "hero_description": "Prenota il tuo appuntamento in pochi secondi. Ricevi notifiche e promemoria. Gestisci tutto dal tuo telefono.",
+    "hero_image_url": "https://images.pexels.com/photos/7195799/pexels-photo-7195799.jpeg?auto=compress&cs=tinysrgb&dpr=2&h=650&w=940",
+    "working_days": [1, 2, 3, 4, 5, 6],  # Monday to Saturday
+    "opening_time": "09:00",
+    "closing_time": "19:00",
+    "time_slots": DEFAULT_TIME_SLOTS,
+    "admin_phone": "",
+    "calendar_limit_type": "always",
+    "calendar_limit_value": 0,
+    "salon_name": "parrucco..",
+    "feature1_title": "Prenota Online",
+    "feature1_desc": "Scegli data e ora per il tuo appuntamento",
+    "feature2_title": "Scegli il Parrucchiere",
+    "feature2_desc": "Prenota con il tuo parrucchiere preferito",
+    "feature3_title": "Promemoria Automatici",
+    "feature3_desc": "Ricevi notifiche prima del tuo appuntamento",
+    "feature4_title": "Gestione Facile",
+    "feature4_desc": "Modifica o cancella i tuoi appuntamenti",
+    "cta_title": "Pronto a Trasformare il Tuo Look?",
+    "cta_subtitle": "Registrati ora e prenota il tuo primo appuntamento",
+    "app_section_title": "Scarica l'App sul Tuo Telefono",
+    "app_section_desc": "Installa parrucco.. sul tuo dispositivo per un accesso ancora più rapido. Funziona anche offline!"
+}
+
+async def migrate_settings_defaults():
+    """Create app_settings or add the fields missing from it, and record its schema version"""
+    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0}) or {}
+    missing = {key: value for key, value in DEFAULT_SETTINGS.items() if key not in settings}
+    # Only defaults are written, so concurrent workers converge on the same document
+    await db.settings.update_one(
+        {"id": "app_settings"},
+        {"$set": {**missing, "schema_version": SETTINGS_SCHEMA_VERSION}},
+        upsert=True
+    )
+    await catalog.bump("settings")
+    logging.info(f"Migration: {len(missing)} settings fields filled with defaults")
+
+MIGRATIONS = [
+    ("0001_appointment_end_time", migrate_appointment_end_times),
+    ("0002_appointment_bson_dates", migrate_appointment_dates_to_bson),
+    ("0003_backfill_slot_claims", migrate_backfill_slot_claims),
+    ("0004_backfill_reminder_jobs", migrate_backfill_reminder_jobs),
+    ("0005_sent_notifications_dates", migrate_sent_notifications),
+    ("0006_notification_partitions", migrate_notification_partitions),
+    ("0007_settings_defaults", migrate_settings_defaults),
+]
+
+# Processes starting together (API replicas, worker.py) run the migrations one
+# at a time: the others wait for the lease, then find them applied. The lease is
+# renewed before each migration, so it only has to outlast the longest one.
+MIGRATION_LEASE_SECONDS = int(os.environ.get('MIGRATION_LEASE_SECONDS', '600'))
+
+async def run_migrations():
+    while not await acquire_lease("migrations", MIGRATION_LEASE_SECONDS):
+        await asyncio.sleep(1)
+    try:
+        applied = set(doc["_id"] for doc in await db.migrations.find({}, {"_id": 1}).to_list(None))
+        for name, migration in MIGRATIONS:
+            if name in applied:
+                continue
+            if not await acquire_lease("migrations", MIGRATION_LEASE_SECONDS):
+                raise RuntimeError(f"Migration lease lost before {name}: raise MIGRATION_LEASE_SECONDS")
+            logging.info(f"Running migration {name}")
+            await migration()
+            await db.migrations.update_one(
+                {"_id": name},
+                {"$setOnInsert": {"applied_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+    finally:
+        await db.scheduler_leases.delete_one({"_id": "migrations", "owner": WORKER_ID})
+
+# Index registry
+# Every access pattern in this file should be covered by one of these indexes.
+# ensure_indexes() creates them at startup; creation is idempotent, and an index
+# whose options changed in the registry is dropped and rebuilt.
+SENT_NOTIFICATIONS_RETENTION_SECONDS = 30 * 24 * 3600
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),  # login, register
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "appointments": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Day scans and overlap range queries per hairdresser
+        IndexModel([("hairdresser_id", ASCENDING), ("date_time", ASCENDING), ("end_time", ASCENDING)]),
+        # /appointments/my and the reminder scan
+        IndexModel([("user_id", ASCENDING), ("date_time", DESCENDING)]),
+        # Admin list (sorted by date, optional status filter) and retention cleanup
+        IndexModel([("date_time", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("date_time", ASCENDING)]),
+    ],
+    "sent_notifications": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        # Records are only needed while a reminder could still be sent again
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=SENT_NOTIFICATIONS_RETENTION_SECONDS),
+    ],
+    "reminder_jobs": [
+        IndexModel([("partition", ASCENDING), ("due_at", ASCENDING)]),
+        IndexModel([("appointment_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+    "push_queue": [
+        IndexModel([("partition", ASCENDING), ("next_attempt_at", ASCENDING)]),
+    ],
+    "revoked_tokens": [
+        IndexModel([("revoked_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "scheduler_leases": [
+        IndexModel([("owner", ASCENDING)]),
+    ],
+    "scheduler_workers": [
+        # Workers that died without releasing their leases
+        IndexModel([("heartbeat_at", ASCENDING)], expireAfterSeconds=24 * 3600),
+    ],
+    "push_endpoints": [
+        # Failure streaks of endpoints that stopped failing without a success are forgotten
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=30 * 24 * 3600),
+    ],
+    "slot_claims": [
+        IndexModel([("appointment_id", ASCENDING)]),
+        IndexModel([("claimed_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "services": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "hairdressers": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "closures": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("date", ASCENDING)]),
+    ],
+    "settings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+}
+
+INDEX_OPTIONS = ["unique", "sparse", "expireAfterSeconds", "partialFilterExpression"]
+
+def index_options_match(existing: dict, declared: dict) -> bool:
+    return all(existing.get(option, False) == declared.get(option, False) for option in INDEX_OPTIONS)
+
+async def ensure_indexes():
+    """Create every index of the registry that is missing or out of date"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        for model in models:
+            spec = model.document
+            current = existing.get(spec["name"])
+            if current is not None:
+                if index_options_match(current, spec):
+                    continue
+                logging.info(f"Rebuilding index {collection_name}.{spec['name']} with new options")
+                await collection.drop_index(spec["name"])
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                # e.g. duplicate emails preventing a unique index: keep serving
+                logging.error(f"Could not create index {collection_name}.{spec['name']}: {e}")
+
+async def get_index_report() -> dict:
+    """Missing, undeclared and unused indexes per collection"""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        declared = set(model.document["name"] for model in models)
+        existing = await collection.index_information()
+        # Access counters are reset when mongod restarts
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+        accesses = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+        report[collection_name] = {
+            "missing": sorted(declared - set(existing)),
+            "undeclared": sorted(set(existing) - declared - {"_id_"}),
+            "unused": sorted(name for name in existing if name != "_id_" and accesses.get(name, 0) == 0),
+            "accesses": accesses
+        }
+    return report
+
+# Background jobs
+# They run inside the API processes unless RUN_SCHEDULERS=false, in which case
+# the standalone worker (python -m backend.worker) runs them.
+RUN_SCHEDULERS = os.environ.get('RUN_SCHEDULERS', 'true').lower() == 'true'
+
+def start_background_jobs() -> List[asyncio.Task]:
     # Start notification scheduler
     scheduler_task = asyncio.create_task(notification_scheduler())
     logging.info("Notification scheduler started")
@@ -201,17 +988,66 @@ async def lifespan(app: FastAPI):
     # Start cleanup scheduler
     cleanup_task = asyncio.create_task(cleanup_scheduler())
     logging.info("Cleanup scheduler started")
+    return [scheduler_task, cleanup_task]
+
+async def stop_background_jobs(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if tasks:
+        await release_scheduler_leases()
+    await push_client.close()
+
+def background_jobs_health() -> dict:
+    """Last successful run of each background loop; stale when a loop is stuck or failing"""
+    now = datetime.now(timezone.utc)
+    # The notification loop ticks at least three times per lease period
+    limits = {"notifications": SCHEDULER_LEASE_SECONDS, "cleanup": 2 * CLEANUP_INTERVAL_SECONDS}
+    jobs = {}
+    for name, limit in limits.items():
+        last_run = scheduler_state[f"{name}_at"]
+        jobs[name] = {
+            "last_run": last_run.isoformat() if last_run else None,
+            "healthy": last_run is not None and (now - last_run).total_seconds() <= limit
+        }
+    return {"worker_id": WORKER_ID, "partitions": scheduler_state["partitions"], "jobs": jobs}
+
+async def mongo_healthy() -> bool:
+    try:
+        await db.command("ping")
+        return True
+    except Exception as e:
+        logging.error(f"Health check: MongoDB unreachable: {e}")
+        return False
+
+# Lifespan
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring stored documents up to date before serving requests
+    await run_migrations()
+    await ensure_indexes()
     
-    # Run initial cleanup on startup
-    await cleanup_old_appointments()
+    # With RUN_SCHEDULERS=false the background jobs run in worker.py instead
+    tasks = []
+    if RUN_SCHEDULERS:
+        # The cleanup scheduler runs its first pass right away
+        tasks = start_background_jobs()
     
     yield
     # Cleanup
-    scheduler_task.cancel()
-    cleanup_task.cancel()
+    await stop_background_jobs(tasks)
     client.close()
 
-app = FastAPI(lifespan=lifespan)
+# JSON responses
+# Bodies are encoded with orjson. Routes returning documents that already have
+# the response model's shape (projected on its fields, written only by this
+# file) return FastJSONResponse directly and skip the model validation.
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        # UTC datetimes end in "Z", as when pydantic serializes them
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Models
@@ -387,41 +1223,223 @@ class Appointment(BaseModel):
     status: str  # pending, confirmed, cancelled
     created_at: datetime
 
+APPOINTMENT_RESPONSE_FIELDS = {"_id": 0, **{name: 1 for name in Appointment.model_fields}}
+
 # Helper functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def run_password_hashing(fn, *args):
+    """Run a bcrypt operation in the password pool, rejecting it with 503 when the queue is full"""
+    global pending_password_hashes
+    if pending_password_hashes >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Server occupato, riprova tra qualche istante",
+            headers={"Retry-After": "1"}
+        )
+    pending_password_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        pending_password_hashes -= 1
+
+async def hash_password(password: str) -> str:
+    return await run_password_hashing(pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; also returns a new hash when the stored one uses outdated settings"""
+    return await run_password_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
 
 def create_access_token(user_id: str, email: str, is_admin: bool) -> str:
-    expire = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(hours=JWT_EXPIRATION_HOURS)
     to_encode = {
         "sub": user_id,
         "email": email,
         "is_admin": is_admin,
-        "exp": expire
+        "iat": now,
+        "exp": expire,
+        # Unique per login, so revoking one session never revokes another
+        "jti": uuid.uuid4().hex
     }
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+# Verified tokens
+# Payloads of verified tokens are kept in an LRU keyed by the token digest, so
+# polling clients skip the HMAC check and claim parsing until the token expires.
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+
+class TokenCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[dict]:
+        payload = self._entries.get(digest)
+        if payload is None:
+            self.misses += 1
+            return None
+        if payload["exp"] <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return payload
+
+    def set(self, digest: str, payload: dict):
+        self._entries[digest] = payload
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, digest: str):
+        self._entries.pop(digest, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+# Token revocation
+# db.revoked_tokens holds revoked token digests (logout) and per-user cutoffs
+# (account deletion: every token issued before is invalid). Entries expire with
+# the tokens they revoke. Each process keeps the set in memory and pulls new
+# entries every TOKEN_REVOCATION_REFRESH_SECONDS; revocations made by the
+# process itself apply immediately.
+TOKEN_REVOCATION_REFRESH_SECONDS = int(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', '5'))
+
+class TokenRevocations:
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._tokens: Dict[str, datetime] = {}  # digest -> expires_at
+        self._users: Dict[str, datetime] = {}  # user_id -> tokens issued before are revoked
+        self._synced_at: Optional[datetime] = None
+        self._checked_at = 0.0
+
+    async def refresh(self):
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = time.monotonic()
+        now = datetime.now(timezone.utc)
+        query: Dict[str, Any] = {"expires_at": {"$gt": now}}
+        if self._synced_at is not None:
+            # Margin for clock skew between processes
+            query["revoked_at"] = {"$gte": self._synced_at - timedelta(seconds=30)}
+        docs = await db.revoked_tokens.find(query).to_list(None)
+        for doc in docs:
+            self._remember(doc)
+        self._synced_at = now
+        
+        self._tokens = {digest: exp for digest, exp in self._tokens.items() if exp > now}
+        self._users = {user_id: cutoff for user_id, cutoff in self._users.items() if cutoff > now - timedelta(hours=JWT_EXPIRATION_HOURS)}
+
+    def _remember(self, doc: dict):
+        if doc.get("user_id"):
+            cutoff = doc["revoked_before"]
+            self._users[doc["user_id"]] = max(cutoff, self._users.get(doc["user_id"], cutoff))
+        else:
+            self._tokens[doc["_id"]] = doc["expires_at"]
+
+    def is_revoked(self, digest: str, payload: dict) -> bool:
+        if digest in self._tokens:
+            return True
+        cutoff = self._users.get(payload["sub"])
+        # Tokens issued before iat was added are revoked too
+        return cutoff is not None and payload.get("iat", 0) < cutoff.timestamp()
+
+    async def revoke_token(self, digest: str, expires_at: datetime):
+        doc = {"_id": digest, "revoked_at": datetime.now(timezone.utc), "expires_at": expires_at}
+        await db.revoked_tokens.replace_one({"_id": digest}, doc, upsert=True)
+        self._remember(doc)
+
+    async def revoke_user(self, user_id: str):
+        now = datetime.now(timezone.utc)
+        doc = {
+            "_id": f"user:{user_id}",
+            "user_id": user_id,
+            "revoked_before": now,
+            "revoked_at": now,
+            "expires_at": now + timedelta(hours=JWT_EXPIRATION_HOURS)
+        }
+        await db.revoked_tokens.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        self._remember(doc)
+
+token_revocations = TokenRevocations(TOKEN_REVOCATION_REFRESH_SECONDS)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    token = credentials.credentials
+    digest = token_digest(token)
+    await token_revocations.refresh()
+    
+    payload = token_cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.set(digest, payload)
+    
+    if token_revocations.is_revoked(digest, payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
 
 async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    # is_admin is authoritative in the token: admin rights are never granted or removed through the API
     if not current_user.get("is_admin"):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+# Short-lived cache of the user fields needed by request handlers. Entries are
+# dropped on approve, revoke and delete in this process; other processes see
+# the change within USER_CACHE_TTL_SECONDS.
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+USER_CACHE_SIZE = 4096
+USER_CACHE_FIELDS = {"_id": 0, "id": 1, "email": 1, "name": 1, "phone": 1, "is_admin": 1, "is_approved": 1}
+
+class UserCache:
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # user_id -> (loaded_at, user)
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+    async def load(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            self._entries.move_to_end(user_id)
+            return entry[1]
+        
+        user = await db.users.find_one({"id": user_id}, USER_CACHE_FIELDS)
+        if user is None:
+            self._entries.pop(user_id, None)
+            return None
+        self._entries[user_id] = (time.monotonic(), user)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_SIZE)
+
+async def get_current_user_record(current_user: dict = Depends(get_current_user)) -> dict:
+    """User document of the caller, loaded at most once per request and cached for a short time"""
+    user = await user_cache.load(current_user["sub"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
 # Auth routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_data: UserRegister):
@@ -433,7 +1451,7 @@ async def register(user_data: UserRegister):
     user_doc = {
         "id": user_id,
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "name": user_data.name,
         "phone": user_data.phone,
         "is_admin": False,
@@ -442,7 +1460,11 @@ async def register(user_data: UserRegister):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Concurrent registration with the same email (unique index on users.email)
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     token = create_access_token(user_id, user_data.email, False)
     user = User(
@@ -460,8 +1482,14 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await verify_password(credentials.password, user["password_hash"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Transparent upgrade to the current bcrypt cost
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": new_hash}})
     
     token = create_access_token(user["id"], user["email"], user.get("is_admin", False))
     user_obj = User(
@@ -475,30 +1503,32 @@ async def login(credentials: UserLogin):
     
     return TokenResponse(access_token=token, user=user_obj)
 
+@api_router.post("/auth/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(get_current_user)
+):
+    """Revoke the current token"""
+    digest = token_digest(credentials.credentials)
+    await token_revocations.revoke_token(digest, datetime.fromtimestamp(current_user["exp"], timezone.utc))
+    token_cache.discard(digest)
+    return {"message": "Logout effettuato"}
+
 # Admin - Gestione Clienti
 @api_router.get("/admin/clients")
-async def get_clients(current_user: dict = Depends(get_current_user)):
-    # Verifica che sia admin
-    user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-    if not user or not user.get("is_admin", False):
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
+async def get_clients(current_user: dict = Depends(get_admin_user)):
     # Ottieni tutti i clienti (non admin)
     clients = await db.users.find({"is_admin": {"$ne": True}}, {"_id": 0, "password_hash": 0}).to_list(1000)
-    return clients
+    return FastJSONResponse(clients)
 
 @api_router.put("/admin/clients/{client_id}/approve")
-async def approve_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    # Verifica che sia admin
-    user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-    if not user or not user.get("is_admin", False):
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
+async def approve_client(client_id: str, current_user: dict = Depends(get_admin_user)):
     # Approva il cliente
     result = await db.users.update_one(
         {"id": client_id},
         {"$set": {"is_approved": True}}
     )
+    user_cache.invalidate(client_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -506,17 +1536,13 @@ async def approve_client(client_id: str, current_user: dict = Depends(get_curren
     return {"message": "Cliente approvato con successo"}
 
 @api_router.put("/admin/clients/{client_id}/revoke")
-async def revoke_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    # Verifica che sia admin
-    user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-    if not user or not user.get("is_admin", False):
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
+async def revoke_client(client_id: str, current_user: dict = Depends(get_admin_user)):
     # Revoca approvazione
     result = await db.users.update_one(
         {"id": client_id},
         {"$set": {"is_approved": False}}
     )
+    user_cache.invalidate(client_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -524,12 +1550,7 @@ async def revoke_client(client_id: str, current_user: dict = Depends(get_current
     return {"message": "Approvazione revocata"}
 
 @api_router.delete("/admin/clients/{client_id}")
-async def delete_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    # Verifica che sia admin
-    user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-    if not user or not user.get("is_admin", False):
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
+async def delete_client(client_id: str, current_user: dict = Depends(get_admin_user)):
     # Verifica che il cliente esista e non sia admin
     client = await db.users.find_one({"id": client_id}, {"_id": 0})
     if not client:
@@ -539,240 +1560,670 @@ async def delete_client(client_id: str, current_user: dict = Depends(get_current
     
     # Elimina il cliente
     await db.users.delete_one({"id": client_id})
+    user_cache.invalidate(client_id)
+    await token_revocations.revoke_user(client_id)
     
     # Elimina anche gli appuntamenti del cliente
+    appointment_ids = await db.appointments.distinct("id", {"user_id": client_id})
     await db.appointments.delete_many({"user_id": client_id})
+    await release_slot(appointment_ids)
+    await cancel_reminders(appointment_ids)
+    appointment_index.invalidate()
+    availability_cache.invalidate()
     
     return {"message": "Cliente eliminato con successo"}
 
+# Catalog cache
+# Settings, services, hairdressers and closures change only through the admin
+# routes, so they are kept in memory. Each section has a version counter in
+# db.catalog_versions, bumped by every write; other workers notice the change
+# with one find_one on that document at most every CATALOG_CHECK_SECONDS.
+CATALOG_CHECK_SECONDS = float(os.environ.get('CATALOG_CHECK_SECONDS', '5'))
+CATALOG_SECTIONS = ["settings", "services", "hairdressers", "closures"]
+
+class CatalogCache:
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._data: Dict[str, Any] = {}
+        self._by_id: Dict[str, Dict[str, dict]] = {}
+        self._loaded_versions: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+        self._rendered: Dict[str, Tuple[int, bytes, str]] = {}
+        self._lock = asyncio.Lock()
+
+    async def check_versions(self):
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = time.monotonic()
+        doc = await db.catalog_versions.find_one({"_id": "catalog"}) or {}
+        self._versions = {section: doc.get(section, 0) for section in CATALOG_SECTIONS}
+
+    async def get(self, section: str) -> Any:
+        """Cached documents of a section: the settings document (or None) or the list of items"""
+        await self.check_versions()
+        if self._loaded_versions.get(section) != self._versions[section]:
+            async with self._lock:
+                if self._loaded_versions.get(section) != self._versions[section]:
+                    await self._load(section)
+        return self._data[section]
+
+    async def _load(self, section: str):
+        version = self._versions[section]
+        if section == "settings":
+            self._data[section] = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
+        else:
+            items = await db[section].find({}, {"_id": 0}).to_list(None)
+            self._data[section] = items
+            self._by_id[section] = {item["id"]: item for item in items}
+        self._loaded_versions[section] = version
+
+    async def find(self, section: str, item_id: str) -> Optional[dict]:
+        await self.get(section)
+        return self._by_id[section].get(item_id)
+
+    async def rendered(self, section: str, render) -> Tuple[bytes, str]:
+        """Response body built by render() from a section and its content hash, rebuilt only when the section changes"""
+        data = await self.get(section)
+        version = self._loaded_versions[section]
+        cached = self._rendered.get(section)
+        if cached is None or cached[0] != version:
+            body = render(data)
+            cached = (version, body, hashlib.sha256(body).hexdigest()[:32])
+            self._rendered[section] = cached
+        return cached[1], cached[2]
+
+    async def closure_dates(self) -> set:
+        return {closure["date"] for closure in await self.get("closures")}
+
+    async def bump(self, section: str):
+        """Record a write to a section, for this process and the others"""
+        doc = await db.catalog_versions.find_one_and_update(
+            {"_id": "catalog"},
+            {"$inc": {section: 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._versions = {name: doc.get(name, 0) for name in CATALOG_SECTIONS}
+        self._checked_at = time.monotonic()
+
+    def versions(self) -> Dict[str, int]:
+        return dict(self._versions)
+
+catalog = CatalogCache(CATALOG_CHECK_SECONDS)
+
+def render_settings(settings: Optional[dict]) -> bytes:
+    # Migration 0007 completes the stored document; defaults only cover one deleted or edited by hand
+    missing = [key for key in DEFAULT_SETTINGS if key not in (settings or {})]
+    if missing:
+        logging.warning(f"Settings document lacks {missing}, serving defaults for them")
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    return Settings(**settings).model_dump_json().encode()
+
+def render_list(model):
+    adapter = TypeAdapter(List[model])
+    return lambda items: adapter.dump_json(adapter.validate_python(items))
+
+def render_documents(items: List[dict]) -> bytes:
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode()
+
+render_services = render_list(Service)
+render_hairdressers = render_list(Hairdresser)
+
+# Conditional GET for the public catalog routes. Browsers and the PWA keep
+# the body and revalidate it; an unchanged catalog costs a 304 answered
+# from memory. The ETag is weak since the same validator is sent for the
+# plain and the compressed body.
+CATALOG_CACHE_CONTROL = os.environ.get('CATALOG_CACHE_CONTROL', 'public, no-cache')
+
+def etag_matches(request: Request, content_hash: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or f'"{content_hash}"' in candidates
+
+async def catalog_response(request: Request, section: str, render) -> Response:
+    body, content_hash = await catalog.rendered(section, render)
+    headers = {"ETag": f'W/"{content_hash}"', "Cache-Control": CATALOG_CACHE_CONTROL}
+    if etag_matches(request, content_hash):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Services routes
 @api_router.get("/services", response_model=List[Service])
-async def get_services():
-    services = await db.services.find({}, {"_id": 0}).to_list(100)
-    return services
+async def get_services(request: Request):
+    return await catalog_response(request, "services", render_services)
 
 # Hairdressers routes
 @api_router.get("/hairdressers", response_model=List[Hairdresser])
-async def get_hairdressers():
-    hairdressers = await db.hairdressers.find({}, {"_id": 0}).to_list(100)
-    return hairdressers
+async def get_hairdressers(request: Request):
+    return await catalog_response(request, "hairdressers", render_hairdressers)
+
+# In-memory appointment interval index
+# Occupied intervals are kept per (hairdresser, UTC day), sorted by start time, so
+# availability checks become a binary search instead of a Mongo round trip.
+# Days are loaded lazily and kept in sync by the appointment write routes; the TTL
+# bounds how stale a day can get when another worker writes the same calendar.
+# At most APPOINTMENT_INDEX_MAX_DAYS buckets are kept, least recently used first out.
+APPOINTMENT_INDEX_TTL_SECONDS = float(os.environ.get('APPOINTMENT_INDEX_TTL_SECONDS', '15'))
+APPOINTMENT_INDEX_MAX_DAYS = int(os.environ.get('APPOINTMENT_INDEX_MAX_DAYS', '20000'))
+DEFAULT_APPOINTMENT_DURATION = 30  # Used when the appointment's service no longer exists
+
+def to_utc(value) -> datetime:
+    """Convert an ISO string or datetime to a timezone-aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def day_range(day: date) -> dict:
+    """Mongo filter matching BSON dates within one UTC day"""
+    start = day_start(day)
+    return {"$gte": start, "$lt": start + timedelta(days=1)}
+
+class DayIntervals:
+    """Occupied intervals of one hairdresser on one day, sorted by start"""
+    __slots__ = ("starts", "ends", "ids", "max_ends", "loaded_at")
+
+    def __init__(self, loaded_at: float):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.ids: List[str] = []
+        # max_ends[i] is the latest end among intervals 0..i, so overlapping
+        # appointments (legacy data, manual bookings) are still handled correctly
+        self.max_ends: List[datetime] = []
+        self.loaded_at = loaded_at
+
+    def _rebuild_max_ends(self):
+        self.max_ends = []
+        for end in self.ends:
+            self.max_ends.append(end if not self.max_ends or end > self.max_ends[-1] else self.max_ends[-1])
+
+    def add(self, appointment_id: str, start: datetime, end: datetime):
+        pos = bisect_right(self.starts, start)
+        self.starts.insert(pos, start)
+        self.ends.insert(pos, end)
+        self.ids.insert(pos, appointment_id)
+        self._rebuild_max_ends()
+
+    def remove(self, appointment_id: str) -> bool:
+        if appointment_id not in self.ids:
+            return False
+        pos = self.ids.index(appointment_id)
+        del self.starts[pos], self.ends[pos], self.ids[pos]
+        self._rebuild_max_ends()
+        return True
+
+    def overlaps(self, start: datetime, end: datetime, exclude_id: Optional[str] = None) -> bool:
+        # Only intervals starting before `end` can overlap [start, end)
+        pos = bisect_left(self.starts, end)
+        if pos == 0 or self.max_ends[pos - 1] <= start:
+            return False
+        if exclude_id is None:
+            return True
+        return any(self.ends[i] > start and self.ids[i] != exclude_id for i in range(pos))
+
+class AppointmentIndex:
+    """Per-hairdresser, per-day interval index of non-cancelled appointments"""
+
+    def __init__(self, ttl_seconds: float, max_days: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_days = max_days
+        self._days: "OrderedDict[Tuple[str, str], DayIntervals]" = OrderedDict()
+        # appointment id -> index keys of every day the appointment touches
+        self._locations: Dict[str, set] = {}
+        self._generation = 0
+
+    def _is_fresh(self, key: Tuple[str, str], now: float) -> bool:
+        bucket = self._days.get(key)
+        return bucket is not None and now - bucket.loaded_at < self.ttl_seconds
+
+    async def ensure_loaded(self, hairdresser_ids: List[str], start_day: date, end_day: date):
+        """Load every missing or expired (hairdresser, day) bucket of the range with one query"""
+        now = time.monotonic()
+        days = [(start_day + timedelta(days=i)).isoformat() for i in range((end_day - start_day).days + 1)]
+        missing = [h for h in hairdresser_ids if not all(self._is_fresh((h, d), now) for d in days)]
+        for h in hairdresser_ids:
+            if h not in missing:
+                for d in days:
+                    self._days.move_to_end((h, d))
+        if not missing:
+            return
+
+        # Overlap range query on the denormalized end time: also picks up
+        # appointments that started the day before and run past midnight
+        generation = self._generation
+        appointments = await db.appointments.find({
+            "hairdresser_id": {"$in": missing},
+            "date_time": {"$lt": day_start(end_day) + timedelta(days=1)},
+            "end_time": {"$gt": day_start(start_day)},
+            "status": {"$ne": "cancelled"}
+        }, {"_id": 0, "id": 1, "hairdresser_id": 1, "date_time": 1, "end_time": 1}).to_list(None)
+
+        # A write that raced with the query may be missing from the result:
+        # keep the buckets for this call but let the next lookup reload them
+        loaded_at = time.monotonic() if generation == self._generation else float("-inf")
+        reloaded = set()
+        for h in missing:
+            for d in days:
+                key = (h, d)
+                old = self._days.get(key)
+                if old:
+                    for apt_id in old.ids:
+                        self._forget(apt_id, key)
+                self._days[key] = DayIntervals(loaded_at)
+                self._days.move_to_end(key)
+                reloaded.add(key)
+
+        for apt in appointments:
+            self._insert(apt["id"], apt["hairdresser_id"], apt["date_time"], apt["end_time"], reloaded)
+        self._evict(len(reloaded))
+
+    def _evict(self, keep_recent: int):
+        """Drop expired buckets, then the least recently used ones, above max_days"""
+        if len(self._days) <= self.max_days:
+            return
+        now = time.monotonic()
+        for key in [k for k, bucket in self._days.items() if now - bucket.loaded_at >= self.ttl_seconds]:
+            self._drop(key)
+        # The buckets just loaded are the most recent: never evict them
+        while len(self._days) > max(self.max_days, keep_recent):
+            self._drop(next(iter(self._days)))
+
+    def _drop(self, key: Tuple[str, str]):
+        for apt_id in self._days.pop(key).ids:
+            self._forget(apt_id, key)
+
+    def day(self, hairdresser_id: str, date_str: str) -> DayIntervals:
+        return self._days.get((hairdresser_id, date_str)) or DayIntervals(float("-inf"))
+
+    def _forget(self, appointment_id: str, key: Tuple[str, str]):
+        keys = self._locations.get(appointment_id)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._locations[appointment_id]
+
+    def _insert(self, appointment_id: str, hairdresser_id: str, start: datetime, end: datetime, only_keys: Optional[set] = None):
+        day = start.date()
+        last_day = (end - timedelta(microseconds=1)).date()
+        while day <= last_day:
+            key = (hairdresser_id, day.isoformat())
+            bucket = self._days.get(key)
+            # Days not loaded yet will be read from Mongo on first use
+            if bucket is not None and (only_keys is None or key in only_keys):
+                bucket.add(appointment_id, start, end)
+                self._locations.setdefault(appointment_id, set()).add(key)
+            day += timedelta(days=1)
+
+    def add(self, appointment_id: str, hairdresser_id: str, date_time, duration: int):
+        self._generation += 1
+        self.remove(appointment_id)
+        start = to_utc(date_time)
+        self._insert(appointment_id, hairdresser_id, start, start + timedelta(minutes=duration))
+
+    def remove(self, appointment_id: str):
+        self._generation += 1
+        for key in self._locations.pop(appointment_id, ()):
+            if key in self._days:
+                self._days[key].remove(appointment_id)
+
+    def invalidate(self):
+        self._generation += 1
+        self._days.clear()
+        self._locations.clear()
+
+    def prune(self, before_day: date):
+        """Drop the buckets of days before `before_day`"""
+        cutoff = before_day.isoformat()
+        for key in [k for k in self._days if k[1] < cutoff]:
+            self._drop(key)
+
+    def size(self) -> int:
+        return len(self._days)
+
+appointment_index = AppointmentIndex(APPOINTMENT_INDEX_TTL_SECONDS, APPOINTMENT_INDEX_MAX_DAYS)
+
+# Availability result cache
+# Entries are keyed on the request parameters plus the data version they were
+# computed from: a write bumps the version (globally, or only for the affected
+# hairdresser) so stale entries are never served and simply age out of the LRU.
+# Callers read the catalog before the cache, so its versions are current.
+AVAILABILITY_CACHE_SIZE = int(os.environ.get('AVAILABILITY_CACHE_SIZE', '2048'))
+# Not longer than the index TTL: other workers' bookings show up within it
+AVAILABILITY_CACHE_TTL_SECONDS = float(os.environ.get('AVAILABILITY_CACHE_TTL_SECONDS', '15'))
+
+class AvailabilityCache:
+    """In-process LRU/TTL cache of computed availability responses"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._version = 0
+        self._hairdresser_versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, hairdresser_id: str, key: tuple) -> tuple:
+        # Catalog versions too: other workers' closure, service and settings edits
+        # only reach this process through them
+        catalog_versions = catalog.versions()
+        return (
+            self._version,
+            self._hairdresser_versions.get(hairdresser_id, 0),
+            catalog_versions.get("closures"),
+            catalog_versions.get("services"),
+            catalog_versions.get("settings"),
+            hairdresser_id
+        ) + key
+
+    def get(self, hairdresser_id: str, key: tuple):
+        full_key = self._key(hairdresser_id, key)
+        entry = self._entries.get(full_key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl_seconds:
+            if entry is not None:
+                del self._entries[full_key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(full_key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, hairdresser_id: str, key: tuple, value):
+        full_key = self._key(hairdresser_id, key)
+        self._entries[full_key] = (time.monotonic(), value)
+        self._entries.move_to_end(full_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, hairdresser_id: Optional[str] = None):
+        """Drop the entries of one hairdresser, or everything when no id is given"""
+        self.invalidations += 1
+        if hairdresser_id is None:
+            self._version += 1
+            self._hairdresser_versions.clear()
+            self._entries.clear()
+        else:
+            self._hairdresser_versions[hairdresser_id] = self._hairdresser_versions.get(hairdresser_id, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries)
+        }
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL_SECONDS)
+
+def occupancy_bitmap(hairdresser_id: str, date_str: str, time_slots: List[str], service_duration: int) -> int:
+    """Bit i is set when time_slots[i] cannot fit the service on an already loaded day"""
+    start_date = day_start(date.fromisoformat(date_str))
+    intervals = appointment_index.day(hairdresser_id, date_str)
+
+    bitmap = 0
+    for i, slot in enumerate(time_slots):
+        hours, minutes = map(int, slot.split(':'))
+        slot_datetime = start_date.replace(hour=hours, minute=minutes)
+        slot_end = slot_datetime + timedelta(minutes=service_duration)
+        if intervals.overlaps(slot_datetime, slot_end):
+            bitmap |= 1 << i
+    return bitmap
+
+def free_slots(hairdresser_id: str, date_str: str, time_slots: List[str], service_duration: int) -> List[str]:
+    """Slots of an already loaded day that can fit a service of the given duration"""
+    bitmap = occupancy_bitmap(hairdresser_id, date_str, time_slots, service_duration)
+    return [slot for i, slot in enumerate(time_slots) if not bitmap >> i & 1]
+
+def past_slots_mask(time_slots: List[str]) -> int:
+    """Bitmap of today's slots that already started and can no longer be booked"""
+    current_time = datetime.now(timezone.utc).strftime("%H:%M")
+    mask = 0
+    for i, slot in enumerate(time_slots):
+        if slot <= current_time:
+            mask |= 1 << i
+    return mask
+
+def is_working_day(day: date, working_days: List[int]) -> bool:
+    # working_days uses 0=Sunday, 1=Monday, ...
+    return (day.weekday() + 1) % 7 in working_days
+
+async def get_booking_settings() -> dict:
+    """Working days and time slots, falling back to the default schedule"""
+    settings = await catalog.get("settings") or DEFAULT_SETTINGS
+    return {
+        "working_days": settings["working_days"],
+        "time_slots": settings["time_slots"]
+    }
+
+async def get_time_slots() -> List[str]:
+    """Configured booking slots, falling back to the default schedule"""
+    return (await get_booking_settings())["time_slots"]
 
 # Availability check
 @api_router.post("/availability", response_model=AvailabilityResponse)
 async def check_availability(request: AvailabilityRequest):
+    # Unknown ids would only fill the appointment index and the cache
+    if not await catalog.find("hairdressers", request.hairdresser_id):
+        raise HTTPException(status_code=404, detail="Hairdresser not found")
+    
+    cache_key = ("availability", request.service_id, request.date)
+    cached = availability_cache.get(request.hairdresser_id, cache_key)
+    if cached is not None:
+        return cached
+    
     # Check if date is a closure day
-    closure = await db.closures.find_one({"date": request.date}, {"_id": 0})
-    if closure:
-        return AvailabilityResponse(date=request.date, available_slots=[])
+    if request.date in await catalog.closure_dates():
+        response = AvailabilityResponse(date=request.date, available_slots=[])
+        availability_cache.set(request.hairdresser_id, cache_key, response)
+        return response
     
     # Get settings for time slots
-    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
-    if not settings:
-        time_slots = [
-            "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-            "14:00", "14:30", "15:00", "15:30", "16:00", "16:30",
-            "17:00", "17:30", "18:00"
-        ]
-    else:
-        time_slots = settings.get("time_slots", [])
+    time_slots = await get_time_slots()
     
     # Get service to know duration
-    service = await db.services.find_one({"id": request.service_id}, {"_id": 0})
+    service = await catalog.find("services", request.service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    service_duration = service["duration_minutes"]
+    # Occupied intervals come from the in-memory index
+    day = date.fromisoformat(request.date)
+    await appointment_index.ensure_loaded([request.hairdresser_id], day, day)
+    available_slots = free_slots(request.hairdresser_id, request.date, time_slots, service["duration_minutes"])
+    
+    response = AvailabilityResponse(date=request.date, available_slots=available_slots)
+    availability_cache.set(request.hairdresser_id, cache_key, response)
+    return response
+
+# Availability matrix: hairdresser x slot for one day or a short range
+AVAILABILITY_MATRIX_MAX_DAYS = 31
+AVAILABILITY_MATRIX_MAX_HAIRDRESSERS = 50
+
+class AvailabilityMatrixRequest(BaseModel):
+    service_id: str
+    date: Optional[str] = None        # YYYY-MM-DD, oppure start_date/end_date
+    start_date: Optional[str] = None  # YYYY-MM-DD
+    end_date: Optional[str] = None    # YYYY-MM-DD
+    hairdresser_ids: Optional[List[str]] = None  # Default: tutti i parrucchieri
+
+class AvailabilityMatrixDay(BaseModel):
+    date: str
+    closed: bool
+    # hairdresser_id -> one flag per entry of time_slots
+    availability: Dict[str, List[bool]]
+
+class AvailabilityMatrixResponse(BaseModel):
+    service_id: str
+    time_slots: List[str]
+    hairdresser_ids: List[str]
+    days: List[AvailabilityMatrixDay]
+
+@api_router.post("/availability/matrix", response_model=AvailabilityMatrixResponse)
+async def get_availability_matrix(request: AvailabilityMatrixRequest):
+    """Disponibilità di più parrucchieri in una sola richiesta"""
+    try:
+        if request.date:
+            start = end = date.fromisoformat(request.date)
+        elif request.start_date and request.end_date:
+            start = date.fromisoformat(request.start_date)
+            end = date.fromisoformat(request.end_date)
+        else:
+            raise HTTPException(status_code=400, detail="Specify date or start_date and end_date")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
     
-    # Get all appointments for this date and hairdresser
-    start_date = datetime.fromisoformat(request.date).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
-    end_date = start_date + timedelta(days=1)
+    if end < start or (end - start).days >= AVAILABILITY_MATRIX_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must span 1 to {AVAILABILITY_MATRIX_MAX_DAYS} days")
     
-    appointments = await db.appointments.find({
-        "hairdresser_id": request.hairdresser_id,
-        "date_time": {
-            "$gte": start_date.isoformat(),
-            "$lt": end_date.isoformat()
-        },
-        "status": {"$ne": "cancelled"}
-    }, {"_id": 0}).to_list(1000)
+    service = await catalog.find("services", request.service_id)
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
     
-    # Batch fetch all services to avoid N+1 query
-    service_ids = list(set(apt["service_id"] for apt in appointments))
-    services_dict = {}
-    if service_ids:
-        services_list = await db.services.find({"id": {"$in": service_ids}}, {"_id": 0}).to_list(100)
-        services_dict = {s["id"]: s for s in services_list}
+    hairdresser_ids = request.hairdresser_ids
+    if hairdresser_ids is None:
+        hairdresser_ids = [h["id"] for h in await catalog.get("hairdressers")]
+    elif len(hairdresser_ids) > AVAILABILITY_MATRIX_MAX_HAIRDRESSERS:
+        raise HTTPException(status_code=400, detail=f"At most {AVAILABILITY_MATRIX_MAX_HAIRDRESSERS} hairdressers per request")
+    else:
+        for hairdresser_id in hairdresser_ids:
+            if not await catalog.find("hairdressers", hairdresser_id):
+                raise HTTPException(status_code=404, detail=f"Hairdresser {hairdresser_id} not found")
+    
+    booking_settings = await get_booking_settings()
+    working_days = booking_settings["working_days"]
+    time_slots = booking_settings["time_slots"]
+    closure_dates = await catalog.closure_dates()
+    # Same rules as days-status: past days are closed, today's past slots are taken
+    today = datetime.now(timezone.utc).date()
+    past_mask = past_slots_mask(time_slots)
     
-    # Build occupied time ranges
-    occupied_ranges = []
-    for apt in appointments:
-        apt_time = datetime.fromisoformat(apt["date_time"])
-        # Get service duration from pre-fetched services
-        apt_service = services_dict.get(apt["service_id"])
-        apt_duration = apt_service["duration_minutes"] if apt_service else 30
-        
-        start_time = apt_time
-        end_time = apt_time + timedelta(minutes=apt_duration)
-        occupied_ranges.append((start_time, end_time))
+    # One batched appointments query for every hairdresser and day
+    if hairdresser_ids:
+        await appointment_index.ensure_loaded(hairdresser_ids, start, end)
     
-    # Check which slots are available
-    available_slots = []
-    for slot in time_slots:
-        hours, minutes = map(int, slot.split(':'))
-        slot_datetime = start_date.replace(hour=hours, minute=minutes)
-        slot_end = slot_datetime + timedelta(minutes=service_duration)
-        
-        # Check if slot overlaps with any occupied range
-        is_available = True
-        for occ_start, occ_end in occupied_ranges:
-            # Check overlap: slot starts before occupied ends AND slot ends after occupied starts
-            if slot_datetime < occ_end and slot_end > occ_start:
-                is_available = False
-                break
-        
-        if is_available:
-            available_slots.append(slot)
+    days = []
+    current_date = start
+    while current_date <= end:
+        date_str = current_date.isoformat()
+        closed = not is_working_day(current_date, working_days) or date_str in closure_dates or current_date < today
+        availability = {}
+        for hairdresser_id in hairdresser_ids:
+            if closed:
+                availability[hairdresser_id] = [False] * len(time_slots)
+                continue
+            bitmap = occupancy_bitmap(hairdresser_id, date_str, time_slots, service["duration_minutes"])
+            if current_date == today:
+                bitmap |= past_mask
+            availability[hairdresser_id] = [not bitmap >> i & 1 for i in range(len(time_slots))]
+        days.append(AvailabilityMatrixDay(date=date_str, closed=closed, availability=availability))
+        current_date += timedelta(days=1)
     
-    return AvailabilityResponse(date=request.date, available_slots=available_slots)
+    return AvailabilityMatrixResponse(
+        service_id=request.service_id,
+        time_slots=time_slots,
+        hairdresser_ids=hairdresser_ids,
+        days=days
+    )
 
 # Helper function per calcolare disponibilità (usata da più endpoint)
 async def calculate_availability(date_str: str, service_id: str, hairdresser_id: str) -> List[str]:
     """Calcola gli slot disponibili per una data specifica"""
     # Check if date is a closure day
-    closure = await db.closures.find_one({"date": date_str}, {"_id": 0})
-    if closure:
+    if date_str in await catalog.closure_dates():
         return []
     
     # Get settings for time slots
-    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
-    if not settings:
-        time_slots = [
-            "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-            "14:00", "14:30", "15:00", "15:30", "16:00", "16:30",
-            "17:00", "17:30", "18:00"
-        ]
-    else:
-        time_slots = settings.get("time_slots", [])
+    time_slots = await get_time_slots()
     
     # Get service to know duration
-    service = await db.services.find_one({"id": service_id}, {"_id": 0})
-    if not service:
+    service = await catalog.find("services", service_id)
+    if not service or not await catalog.find("hairdressers", hairdresser_id):
         return []
     
-    service_duration = service["duration_minutes"]
-    
-    # Get all appointments for this date and hairdresser
-    start_date = datetime.fromisoformat(date_str).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
-    end_date = start_date + timedelta(days=1)
-    
-    appointments = await db.appointments.find({
-        "hairdresser_id": hairdresser_id,
-        "date_time": {
-            "$gte": start_date.isoformat(),
-            "$lt": end_date.isoformat()
-        },
-        "status": {"$ne": "cancelled"}
-    }, {"_id": 0}).to_list(1000)
-    
-    # Batch fetch all services
-    service_ids = list(set(apt["service_id"] for apt in appointments))
-    services_dict = {}
-    if service_ids:
-        services_list = await db.services.find({"id": {"$in": service_ids}}, {"_id": 0}).to_list(100)
-        services_dict = {s["id"]: s for s in services_list}
-    
-    # Build occupied time ranges
-    occupied_ranges = []
-    for apt in appointments:
-        apt_time = datetime.fromisoformat(apt["date_time"])
-        apt_service = services_dict.get(apt["service_id"])
-        apt_duration = apt_service["duration_minutes"] if apt_service else 30
-        
-        start_time = apt_time
-        end_time = apt_time + timedelta(minutes=apt_duration)
-        occupied_ranges.append((start_time, end_time))
-    
-    # Check which slots are available
-    available_slots = []
-    for slot in time_slots:
-        hours, minutes = map(int, slot.split(':'))
-        slot_datetime = start_date.replace(hour=hours, minute=minutes)
-        slot_end = slot_datetime + timedelta(minutes=service_duration)
-        
-        is_available = True
-        for occ_start, occ_end in occupied_ranges:
-            if slot_datetime < occ_end and slot_end > occ_start:
-                is_available = False
-                break
-        
-        if is_available:
-            available_slots.append(slot)
-    
-    return available_slots
+    day = date.fromisoformat(date_str)
+    await appointment_index.ensure_loaded([hairdresser_id], day, day)
+    return free_slots(hairdresser_id, date_str, time_slots, service["duration_minutes"])
 
 # Endpoint per trovare il primo appuntamento libero
 class FirstAvailableRequest(BaseModel):
     service_id: str
     hairdresser_id: str
-    days_to_search: int = 30  # Cerca nei prossimi 30 giorni
+    days_to_search: int = Field(30, ge=0, le=366)  # Cerca nei prossimi 30 giorni (max un anno)
 
 class FirstAvailableResponse(BaseModel):
     found: bool
     date: Optional[str] = None
     time: Optional[str] = None
 
+# Search windows grow so that a fully booked calendar costs a handful of
+# range queries instead of one query per day
+FIRST_AVAILABLE_WINDOWS = [7, 14, 30]
+
 @api_router.post("/availability/first", response_model=FirstAvailableResponse)
 async def find_first_available(request: FirstAvailableRequest):
     """Trova il primo slot disponibile per un servizio e parrucchiere"""
-    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
-    if not settings:
-        settings = {
-            "working_days": [1, 2, 3, 4, 5, 6],
-            "time_slots": ["09:00", "09:30", "10:00", "10:30", "11:00", "11:30", "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30", "18:00"]
-        }
+    booking_settings = await get_booking_settings()
+    working_days = booking_settings["working_days"]
+    time_slots = booking_settings["time_slots"]
     
-    working_days = settings.get("working_days", [1, 2, 3, 4, 5, 6])
+    service = await catalog.find("services", request.service_id)
+    if not service:
+        return FirstAvailableResponse(found=False)
+    if not await catalog.find("hairdressers", request.hairdresser_id):
+        raise HTTPException(status_code=404, detail="Hairdresser not found")
+    closure_dates = await catalog.closure_dates()
     
     # Cerca nei prossimi X giorni
     today = datetime.now(timezone.utc).date()
-    
-    for day_offset in range(request.days_to_search):
-        check_date = today + timedelta(days=day_offset)
-        
-        # Salta se non è un giorno lavorativo
-        weekday = check_date.weekday() + 1
-        if weekday == 7:
-            weekday = 0  # Domenica = 0
-        if weekday not in working_days:
-            continue
-        
-        # Controlla se è un giorno di chiusura
-        closure = await db.closures.find_one({"date": check_date.isoformat()})
-        if closure:
-            continue
+    last_day = today + timedelta(days=request.days_to_search - 1)
+    all_slots_mask = (1 << len(time_slots)) - 1
+    
+    window_start = today
+    window_number = 0
+    while window_start <= last_day:
+        # 7, 14, 30 days, then keep doubling
+        if window_number < len(FIRST_AVAILABLE_WINDOWS):
+            window_days = FIRST_AVAILABLE_WINDOWS[window_number]
+        else:
+            window_days = FIRST_AVAILABLE_WINDOWS[-1] * 2 ** (window_number - len(FIRST_AVAILABLE_WINDOWS) + 1)
+        window_end = min(window_start + timedelta(days=window_days - 1), last_day)
         
-        date_str = check_date.isoformat()
+        await appointment_index.ensure_loaded([request.hairdresser_id], window_start, window_end)
         
-        # Usa la funzione helper per calcolare disponibilità
-        available_slots = await calculate_availability(date_str, request.service_id, request.hairdresser_id)
+        check_date = window_start
+        while check_date <= window_end:
+            date_str = check_date.isoformat()
+            # Salta giorni non lavorativi e giorni di chiusura
+            if is_working_day(check_date, working_days) and date_str not in closure_dates:
+                bitmap = occupancy_bitmap(request.hairdresser_id, date_str, time_slots, service["duration_minutes"])
+                # Filtra slot passati se è oggi
+                if check_date == today:
+                    bitmap |= past_slots_mask(time_slots)
+                if bitmap != all_slots_mask:
+                    free_index = next(i for i in range(len(time_slots)) if not bitmap >> i & 1)
+                    return FirstAvailableResponse(
+                        found=True,
+                        date=date_str,
+                        time=time_slots[free_index]
+                    )
+            check_date += timedelta(days=1)
         
-        if available_slots:
-            # Filtra slot passati se è oggi
-            if check_date == today:
-                now = datetime.now(timezone.utc)
-                current_time = now.strftime("%H:%M")
-                available_slots = [s for s in available_slots if s > current_time]
-            
-            if available_slots:
-                return FirstAvailableResponse(
-                    found=True,
-                    date=date_str,
-                    time=available_slots[0]
-                )
+        window_start = window_end + timedelta(days=1)
+        window_number += 1
     
     return FirstAvailableResponse(found=False)
 
 # Endpoint per ottenere lo stato dei giorni (liberi/occupati)
+DAYS_STATUS_MAX_DAYS = 366
+
 class DaysStatusRequest(BaseModel):
     service_id: str
     hairdresser_id: str
@@ -783,80 +2234,116 @@ class DayStatus(BaseModel):
     date: str
     status: str  # "available", "full", "closed"
 
-@api_router.post("/availability/days-status", response_model=List[DayStatus])
-async def get_days_status(request: DaysStatusRequest):
-    """Ottieni lo stato di disponibilità per un range di giorni"""
-    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
-    if not settings:
-        settings = {
-            "working_days": [1, 2, 3, 4, 5, 6],
-        }
+async def compute_days_status(service_id: str, hairdresser_id: str, start: date, end: date) -> List[DayStatus]:
+    """Status of every day in [start, end] from one read of settings, closures, service and appointments"""
+    booking_settings = await get_booking_settings()
+    working_days = booking_settings["working_days"]
+    time_slots = booking_settings["time_slots"]
     
-    working_days = settings.get("working_days", [1, 2, 3, 4, 5, 6])
+    closure_dates = await catalog.closure_dates()
+    service = await catalog.find("services", service_id)
     
-    start = datetime.fromisoformat(request.start_date).date()
-    end = datetime.fromisoformat(request.end_date).date()
+    today = datetime.now(timezone.utc).date()
+    first_open_day = max(start, today)
+    if service and first_open_day <= end:
+        await appointment_index.ensure_loaded([hairdresser_id], first_open_day, end)
     
-    # Ottieni tutte le chiusure nel range
-    closures = await db.closures.find({
-        "date": {"$gte": request.start_date, "$lte": request.end_date}
-    }, {"_id": 0}).to_list(100)
-    closure_dates = set(c["date"] for c in closures)
+    past_mask = past_slots_mask(time_slots)
+    all_slots_mask = (1 << len(time_slots)) - 1
     
     results = []
     current_date = start
-    today = datetime.now(timezone.utc).date()
-    
     while current_date <= end:
         date_str = current_date.isoformat()
         
-        # Weekday check
-        weekday = current_date.weekday() + 1
-        if weekday == 7:
-            weekday = 0
-        
-        if weekday not in working_days or date_str in closure_dates:
-            results.append(DayStatus(date=date_str, status="closed"))
-        elif current_date < today:
-            results.append(DayStatus(date=date_str, status="closed"))
+        if not is_working_day(current_date, working_days) or date_str in closure_dates or current_date < today:
+            status_value = "closed"
+        elif not service:
+            status_value = "full"
         else:
-            # Usa la funzione helper per calcolare disponibilità
-            available_slots = await calculate_availability(date_str, request.service_id, request.hairdresser_id)
-            
-            # Filtra slot passati se è oggi
+            bitmap = occupancy_bitmap(hairdresser_id, date_str, time_slots, service["duration_minutes"])
             if current_date == today:
-                now = datetime.now(timezone.utc)
-                current_time = now.strftime("%H:%M")
-                available_slots = [s for s in available_slots if s > current_time]
-            
-            if available_slots:
-                results.append(DayStatus(date=date_str, status="available"))
-            else:
-                results.append(DayStatus(date=date_str, status="full"))
+                bitmap |= past_mask
+            status_value = "available" if bitmap != all_slots_mask else "full"
         
+        results.append(DayStatus(date=date_str, status=status_value))
         current_date += timedelta(days=1)
     
     return results
 
+@api_router.post("/availability/days-status", response_model=List[DayStatus])
+async def get_days_status(request: DaysStatusRequest):
+    """Ottieni lo stato di disponibilità per un range di giorni"""
+    try:
+        start = datetime.fromisoformat(request.start_date).date()
+        end = datetime.fromisoformat(request.end_date).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    if end < start or (end - start).days >= DAYS_STATUS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must span 1 to {DAYS_STATUS_MAX_DAYS} days")
+    # Unknown ids would only fill the appointment index with empty days
+    if not await catalog.find("hairdressers", request.hairdresser_id):
+        raise HTTPException(status_code=404, detail="Hairdresser not found")
+    
+    # Past days and today's past slots depend on the clock: key on the minute
+    # when today is in range, on the day otherwise
+    now = datetime.now(timezone.utc)
+    clock = now.strftime("%Y-%m-%dT%H:%M") if start <= now.date() <= end else now.date().isoformat()
+    cache_key = ("days-status", request.service_id, start, end, clock)
+    
+    cached = availability_cache.get(request.hairdresser_id, cache_key)
+    if cached is not None:
+        return cached
+    
+    results = await compute_days_status(request.service_id, request.hairdresser_id, start, end)
+    availability_cache.set(request.hairdresser_id, cache_key, results)
+    return results
+
+async def get_service_duration(service_id: str) -> int:
+    service = await catalog.find("services", service_id)
+    return service["duration_minutes"] if service else DEFAULT_APPOINTMENT_DURATION
+
+def appointment_times(date_time: datetime, duration_minutes: int) -> dict:
+    """Denormalized time fields stored on every appointment"""
+    start = to_utc(date_time)
+    return {
+        "date_time": start,
+        "duration_minutes": duration_minutes,
+        "end_time": start + timedelta(minutes=duration_minutes)
+    }
+
 # Helper function to check slot availability
-async def is_slot_available(hairdresser_id: str, service_id: str, date_time: datetime, exclude_appointment_id: str = None) -> bool:
-    """Check if a time slot is available for booking"""
-    # Get service duration
-    service = await db.services.find_one({"id": service_id}, {"_id": 0})
-    if not service:
+async def is_slot_available(hairdresser_id: str, service_id: str, date_time: datetime, exclude_appointment_id: str = None, duration_minutes: Optional[int] = None) -> bool:
+    """Check if a time slot is available for booking; duration_minutes overrides the service's current duration"""
+    if not await catalog.find("hairdressers", hairdresser_id):
         return False
-    service_duration = service["duration_minutes"]
+    if duration_minutes is None:
+        # Get service duration
+        service = await catalog.find("services", service_id)
+        if not service:
+            return False
+        duration_minutes = service["duration_minutes"]
+    service_duration = duration_minutes
     
-    # Get all appointments for this date and hairdresser
-    start_date = date_time.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_date = start_date + timedelta(days=1)
+    slot_start = to_utc(date_time)
+    slot_end = slot_start + timedelta(minutes=service_duration)
     
+    # Fast rejection from the in-memory index (the slot may run past midnight)
+    first_day, last_day = slot_start.date(), (slot_end - timedelta(microseconds=1)).date()
+    await appointment_index.ensure_loaded([hairdresser_id], first_day, last_day)
+    
+    day = first_day
+    while day <= last_day:
+        intervals = appointment_index.day(hairdresser_id, day.isoformat())
+        if intervals.overlaps(slot_start, slot_end, exclude_id=exclude_appointment_id):
+            return False
+        day += timedelta(days=1)
+    
+    # Authoritative check: another worker may have booked since the index was loaded
     query = {
         "hairdresser_id": hairdresser_id,
-        "date_time": {
-            "$gte": start_date.isoformat(),
-            "$lt": end_date.isoformat()
-        },
+        "date_time": {"$lt": slot_end},
+        "end_time": {"$gt": slot_start},
         "status": {"$ne": "cancelled"}
     }
     
@@ -864,47 +2351,110 @@ async def is_slot_available(hairdresser_id: str, service_id: str, date_time: dat
     if exclude_appointment_id:
         query["id"] = {"$ne": exclude_appointment_id}
     
-    appointments = await db.appointments.find(query, {"_id": 0}).to_list(1000)
-    
-    # Batch fetch services
-    service_ids = list(set(apt["service_id"] for apt in appointments))
-    services_dict = {}
-    if service_ids:
-        services_list = await db.services.find({"id": {"$in": service_ids}}, {"_id": 0}).to_list(100)
-        services_dict = {s["id"]: s for s in services_list}
+    conflict = await db.appointments.find_one(query, {"_id": 0, "id": 1})
+    return conflict is None
+
+# Atomic slot reservation
+# Every appointment claims the SLOT_CLAIM_UNIT_MINUTES time units it covers in
+# db.slot_claims. The claim _id is "<hairdresser_id>|<unit start>", so Mongo's
+# unique _id guarantees that two overlapping bookings can never both succeed,
+# without transactions or locks. Claims expire with the appointment (TTL index).
+# Not configurable: claim ids depend on it, so changing it would stop new
+# claims from colliding with the existing ones
+SLOT_CLAIM_UNIT_MINUTES = 5
+SLOT_CLAIM_RETENTION = timedelta(days=1)
+ORPHAN_CLAIM_GRACE = timedelta(minutes=10)
+
+def slot_claim_ids(hairdresser_id: str, start: datetime, end: datetime) -> List[Tuple[str, datetime]]:
+    """Claim ids of the units covering [start, end), rounded outwards to whole units"""
+    unit = timedelta(minutes=SLOT_CLAIM_UNIT_MINUTES)
+    start = to_utc(start)
+    current = start - (start - day_start(start.date())) % unit
+    claims = []
+    while current < end:
+        claims.append((f"{hairdresser_id}|{current.isoformat()}", current))
+        current += unit
+    return claims
+
+async def claim_slot(hairdresser_id: str, appointment_id: str, start: datetime, end: datetime) -> bool:
+    """Atomically reserve [start, end) for the appointment; False when another appointment holds any unit"""
+    claims = slot_claim_ids(hairdresser_id, start, end)
+    claim_ids = [claim_id for claim_id, _ in claims]
+    
+    # Units the appointment already holds (rescheduling onto an overlapping time) are kept
+    owned = await db.slot_claims.find(
+        {"_id": {"$in": claim_ids}, "appointment_id": appointment_id}, {"_id": 1}
+    ).to_list(None)
+    owned_ids = set(doc["_id"] for doc in owned)
     
-    # Build occupied time ranges
-    slot_start = date_time
-    slot_end = date_time + timedelta(minutes=service_duration)
-    
-    for apt in appointments:
-        apt_time = datetime.fromisoformat(apt["date_time"])
-        if apt_time.tzinfo is None:
-            apt_time = apt_time.replace(tzinfo=timezone.utc)
-        apt_service = services_dict.get(apt["service_id"])
-        apt_duration = apt_service["duration_minutes"] if apt_service else 30
-        
-        apt_start = apt_time
-        apt_end = apt_time + timedelta(minutes=apt_duration)
-        
-        # Check overlap
-        if slot_start < apt_end and slot_end > apt_start:
-            return False
+    now = datetime.now(timezone.utc)
+    new_claims = [{
+        "_id": claim_id,
+        "hairdresser_id": hairdresser_id,
+        "appointment_id": appointment_id,
+        "unit": unit_start,
+        "claimed_at": now,
+        "expires_at": to_utc(end) + SLOT_CLAIM_RETENTION
+    } for claim_id, unit_start in claims if claim_id not in owned_ids]
+    if not new_claims:
+        return True
     
+    inserted_ids = []
+    while new_claims:
+        try:
+            await db.slot_claims.insert_many(new_claims, ordered=True)
+            return True
+        except BulkWriteError as e:
+            # Ordered insert: the claims before the failing one were written by this call
+            error = e.details["writeErrors"][0]
+            inserted_ids += [claim["_id"] for claim in new_claims[:error["index"]]]
+            failed_id = new_claims[error["index"]]["_id"]
+            holder = None
+            if error["code"] == 11000:
+                holder = await db.slot_claims.find_one({"_id": failed_id}, {"_id": 0, "appointment_id": 1})
+            if holder is None or holder["appointment_id"] != appointment_id:
+                # Another appointment holds the unit: give back only what this call took
+                if inserted_ids:
+                    await db.slot_claims.delete_many({"_id": {"$in": inserted_ids}})
+                return False
+            # Claimed concurrently for the same appointment (e.g. by another process backfilling): already ours
+            new_claims = new_claims[error["index"] + 1:]
     return True
 
+async def release_slot(appointment_ids: List[str], keep_claim_ids: Optional[List[str]] = None):
+    """Release the claims of the given appointments, except the ones listed in keep_claim_ids"""
+    query: Dict[str, Any] = {"appointment_id": {"$in": appointment_ids}}
+    if keep_claim_ids:
+        query["_id"] = {"$nin": keep_claim_ids}
+    await db.slot_claims.delete_many(query)
+
+async def move_slot_claim(hairdresser_id: str, appointment_id: str, start: datetime, end: datetime) -> bool:
+    """Claim the new time first, then release the units of the old time that are no longer covered"""
+    if not await claim_slot(hairdresser_id, appointment_id, start, end):
+        return False
+    await release_slot([appointment_id], keep_claim_ids=[claim_id for claim_id, _ in slot_claim_ids(hairdresser_id, start, end)])
+    return True
+
+async def release_orphan_claims():
+    """Drop claims left behind by a booking that failed between claim and insert"""
+    cutoff = datetime.now(timezone.utc) - ORPHAN_CLAIM_GRACE
+    claimed_ids = await db.slot_claims.distinct("appointment_id", {"claimed_at": {"$lt": cutoff}})
+    if not claimed_ids:
+        return
+    existing_ids = set(await db.appointments.distinct("id", {"id": {"$in": claimed_ids}}))
+    orphan_ids = [apt_id for apt_id in claimed_ids if apt_id not in existing_ids]
+    if orphan_ids:
+        await release_slot(orphan_ids)
+        logging.info(f"Cleanup: released slot claims of {len(orphan_ids)} missing appointments")
+
 # Appointments routes
 @api_router.options("/appointments")
 async def appointments_options():
     return {"message": "OK"}
 
 @api_router.post("/appointments", response_model=Appointment)
-async def create_appointment(appointment_data: AppointmentCreate, current_user: dict = Depends(get_current_user)):
+async def create_appointment(appointment_data: AppointmentCreate, user: dict = Depends(get_current_user_record)):
     # Check if user is approved
-    user = await db.users.find_one({"id": current_user["sub"]}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     if not user.get("is_approved", False) and not user.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Il tuo account non è ancora stato approvato. Attendi l'approvazione per prenotare.")
     
@@ -925,16 +2475,20 @@ async def create_appointment(appointment_data: AppointmentCreate, current_user:
         raise HTTPException(status_code=400, detail="Questo orario non è più disponibile. Seleziona un altro orario.")
     
     # Get hairdresser details
-    hairdresser = await db.hairdressers.find_one({"id": appointment_data.hairdresser_id}, {"_id": 0})
+    hairdresser = await catalog.find("hairdressers", appointment_data.hairdresser_id)
     if not hairdresser:
         raise HTTPException(status_code=404, detail="Hairdresser not found")
     
     # Get service details
-    service = await db.services.find_one({"id": appointment_data.service_id}, {"_id": 0})
+    service = await catalog.find("services", appointment_data.service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
     appointment_id = str(uuid.uuid4())
+    times = appointment_times(appointment_data.date_time, service["duration_minutes"])
+    if not await claim_slot(hairdresser["id"], appointment_id, times["date_time"], times["end_time"]):
+        raise HTTPException(status_code=400, detail="Questo orario non è più disponibile. Seleziona un altro orario.")
+    
     appointment_doc = {
         "id": appointment_id,
         "user_id": user["id"],
@@ -944,16 +2498,21 @@ async def create_appointment(appointment_data: AppointmentCreate, current_user:
         "hairdresser_name": hairdresser["name"],
         "service_id": service["id"],
         "service_name": service["name"],
-        "date_time": appointment_data.date_time.isoformat(),
+        **times,
         "status": "pending",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
-    await db.appointments.insert_one(appointment_doc)
+    try:
+        await db.appointments.insert_one(appointment_doc)
+    except Exception:
+        await release_slot([appointment_id])
+        raise
+    appointment_index.add(appointment_id, hairdresser["id"], appointment_data.date_time, service["duration_minutes"])
+    availability_cache.invalidate(hairdresser["id"])
+    await schedule_reminders([appointment_doc])
     
-    # Convert ISO strings back to datetime for response
     appointment_doc["date_time"] = appointment_data.date_time
-    appointment_doc["created_at"] = datetime.fromisoformat(appointment_doc["created_at"])
     
     return Appointment(**appointment_doc)
 
@@ -961,14 +2520,10 @@ async def create_appointment(appointment_data: AppointmentCreate, current_user:
 async def get_my_appointments(current_user: dict = Depends(get_current_user)):
     appointments = await db.appointments.find(
         {"user_id": current_user["sub"]},
-        {"_id": 0}
+        APPOINTMENT_RESPONSE_FIELDS
     ).sort("date_time", -1).to_list(100)
     
-    for apt in appointments:
-        apt["date_time"] = datetime.fromisoformat(apt["date_time"])
-        apt["created_at"] = datetime.fromisoformat(apt["created_at"])
-    
-    return appointments
+    return FastJSONResponse(appointments)
 
 @api_router.patch("/appointments/{appointment_id}/cancel")
 async def cancel_appointment(appointment_id: str, current_user: dict = Depends(get_current_user)):
@@ -981,6 +2536,10 @@ async def cancel_appointment(appointment_id: str, current_user: dict = Depends(g
     
     # Delete the appointment immediately instead of marking as cancelled
     await db.appointments.delete_one({"id": appointment_id})
+    await release_slot([appointment_id])
+    await cancel_reminders([appointment_id])
+    appointment_index.remove(appointment_id)
+    availability_cache.invalidate(appointment["hairdresser_id"])
     
     return {"message": "Appuntamento cancellato con successo"}
 
@@ -1000,13 +2559,32 @@ async def reschedule_appointment(appointment_id: str, new_date_time: datetime, c
     if appointment["user_id"] != current_user["sub"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    # Check if new slot is available (excluding current appointment), with the
+    # same duration the slot claims will cover
+    duration = appointment.get("duration_minutes") or await get_service_duration(appointment["service_id"])
+    slot_available = await is_slot_available(
+        appointment["hairdresser_id"],
+        appointment["service_id"],
+        new_date_time,
+        exclude_appointment_id=appointment_id,
+        duration_minutes=duration
+    )
+    if not slot_available:
+        raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
+    
+    times = appointment_times(new_date_time, duration)
+    if not await move_slot_claim(appointment["hairdresser_id"], appointment_id, times["date_time"], times["end_time"]):
+        raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
+    
     await db.appointments.update_one(
         {"id": appointment_id},
-        {"$set": {"date_time": new_date_time.isoformat()}}
+        {"$set": times}
     )
+    appointment_index.add(appointment_id, appointment["hairdresser_id"], new_date_time, duration)
+    availability_cache.invalidate(appointment["hairdresser_id"])
     
     appointment["date_time"] = new_date_time
-    appointment["created_at"] = datetime.fromisoformat(appointment["created_at"])
+    await schedule_reminders([appointment])
     
     return Appointment(**appointment)
 
@@ -1034,6 +2612,7 @@ async def update_notification_preferences(
         {"id": current_user["sub"]},
         {"$set": {"notification_preferences": prefs.notification_preferences}}
     )
+    await schedule_user_reminders(current_user["sub"])
     
     return {"notification_preferences": prefs.notification_preferences, "message": "Preferenze salvate"}
 
@@ -1053,6 +2632,8 @@ async def subscribe_push(
         {"id": current_user["sub"]},
         {"$set": {"push_subscription": subscription.dict()}}
     )
+    # A fresh subscription starts without failures
+    await db.push_endpoints.delete_one({"_id": subscription.endpoint})
     return {"message": "Push subscription salvata"}
 
 @api_router.delete("/push/unsubscribe")
@@ -1073,43 +2654,32 @@ async def test_push_notification(current_user: dict = Depends(get_current_user))
     
     subscription = user["push_subscription"]
     try:
-        webpush(
-            subscription_info=subscription,
-            data=json.dumps({
-                "title": "Test Notifica 🔔",
-                "body": "Le notifiche funzionano correttamente!",
-                "icon": "/logo192.png",
-                "url": "/dashboard"
-            }),
-            vapid_private_key=VAPID_PRIVATE_KEY,
-            vapid_claims={"sub": VAPID_EMAIL}
-        )
+        await push_client.send(subscription, {
+            "title": "Test Notifica 🔔",
+            "body": "Le notifiche funzionano correttamente!",
+            "icon": "/logo192.png",
+            "url": "/dashboard"
+        })
         return {"message": "Notifica di test inviata!"}
     except WebPushException as e:
+        if await record_push_failure(subscription["endpoint"], push_error_status(e)):
+            raise HTTPException(status_code=410, detail="La subscription push non è più valida. Riattiva le notifiche.")
         raise HTTPException(status_code=500, detail=f"Errore invio notifica: {str(e)}")
 
 # Function to send notification to a specific user
 async def send_push_to_user(user_id: str, title: str, body: str, url: str = "/dashboard"):
-    """Helper function to send push notification to a user"""
+    """Helper function to queue a push notification for a user (delivered with retries)"""
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "push_subscription": 1})
     if not user or "push_subscription" not in user:
         return False
     
-    try:
-        webpush(
-            subscription_info=user["push_subscription"],
-            data=json.dumps({
-                "title": title,
-                "body": body,
-                "icon": "/logo192.png",
-                "url": url
-            }),
-            vapid_private_key=VAPID_PRIVATE_KEY,
-            vapid_claims={"sub": VAPID_EMAIL}
-        )
-        return True
-    except WebPushException:
-        return False
+    await enqueue_push(user_id, {
+        "title": title,
+        "body": body,
+        "icon": "/logo192.png",
+        "url": url
+    })
+    return True
 
 # Admin routes
 @api_router.get("/admin/appointments", response_model=List[Appointment])
@@ -1117,25 +2687,14 @@ async def get_all_appointments(date: Optional[str] = None, status: Optional[str]
     query = {}
     if date:
         # Filter by date (today)
-        start = datetime.fromisoformat(date).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
-        end = start + timedelta(days=1)
-        query = {
-            "date_time": {
-                "$gte": start.isoformat(),
-                "$lt": end.isoformat()
-            }
-        }
+        query = {"date_time": day_range(datetime.fromisoformat(date).date())}
     
     if status:
         query["status"] = status
     
-    appointments = await db.appointments.find(query, {"_id": 0}).sort("date_time", 1).to_list(1000)
-    
-    for apt in appointments:
-        apt["date_time"] = datetime.fromisoformat(apt["date_time"])
-        apt["created_at"] = datetime.fromisoformat(apt["created_at"])
+    appointments = await db.appointments.find(query, APPOINTMENT_RESPONSE_FIELDS).sort("date_time", 1).to_list(1000)
     
-    return appointments
+    return FastJSONResponse(appointments)
 
 @api_router.patch("/admin/appointments/{appointment_id}/confirm", response_model=Appointment)
 async def confirm_appointment(appointment_id: str, current_user: dict = Depends(get_admin_user)):
@@ -1149,8 +2708,6 @@ async def confirm_appointment(appointment_id: str, current_user: dict = Depends(
     )
     
     appointment["status"] = "confirmed"
-    appointment["date_time"] = datetime.fromisoformat(appointment["date_time"])
-    appointment["created_at"] = datetime.fromisoformat(appointment["created_at"])
     
     return Appointment(**appointment)
 
@@ -1163,6 +2720,10 @@ async def update_appointment(appointment_id: str, update_data: AppointmentUpdate
     # If status is being set to cancelled, delete the appointment instead
     if update_data.status == "cancelled":
         await db.appointments.delete_one({"id": appointment_id})
+        await release_slot([appointment_id])
+        await cancel_reminders([appointment_id])
+        appointment_index.remove(appointment_id)
+        availability_cache.invalidate(appointment["hairdresser_id"])
         return {"message": "Appuntamento eliminato"}
     
     update_dict = {}
@@ -1174,17 +2735,24 @@ async def update_appointment(appointment_id: str, update_data: AppointmentUpdate
         if update_data.date_time <= datetime.now(timezone.utc):
             raise HTTPException(status_code=400, detail="Appointment time must be in the future")
         
-        # Check if new slot is available (excluding current appointment)
+        # Check if new slot is available (excluding current appointment), with the
+        # same duration the slot claims will cover
+        duration = appointment.get("duration_minutes") or await get_service_duration(appointment["service_id"])
         slot_available = await is_slot_available(
             appointment["hairdresser_id"],
             appointment["service_id"],
             update_data.date_time,
-            exclude_appointment_id=appointment_id
+            exclude_appointment_id=appointment_id,
+            duration_minutes=duration
         )
         if not slot_available:
             raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
         
-        update_dict["date_time"] = update_data.date_time.isoformat()
+        times = appointment_times(update_data.date_time, duration)
+        if not await move_slot_claim(appointment["hairdresser_id"], appointment_id, times["date_time"], times["end_time"]):
+            raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
+        
+        update_dict.update(times)
         appointment["date_time"] = update_data.date_time
     
     if update_data.status:
@@ -1197,18 +2765,24 @@ async def update_appointment(appointment_id: str, update_data: AppointmentUpdate
             {"$set": update_dict}
         )
     
-    if "date_time" not in update_dict:
-        appointment["date_time"] = datetime.fromisoformat(appointment["date_time"])
+    if "date_time" in update_dict:
+        appointment_index.add(appointment_id, appointment["hairdresser_id"], update_data.date_time, update_dict["duration_minutes"])
+        availability_cache.invalidate(appointment["hairdresser_id"])
     
-    appointment["created_at"] = datetime.fromisoformat(appointment["created_at"])
+    if update_dict:
+        await schedule_reminders([appointment])
     
     return Appointment(**appointment)
 
 @api_router.delete("/admin/appointments/{appointment_id}")
 async def delete_appointment(appointment_id: str, current_user: dict = Depends(get_admin_user)):
-    result = await db.appointments.delete_one({"id": appointment_id})
-    if result.deleted_count == 0:
+    appointment = await db.appointments.find_one_and_delete({"id": appointment_id}, {"_id": 0, "hairdresser_id": 1})
+    if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    await release_slot([appointment_id])
+    await cancel_reminders([appointment_id])
+    appointment_index.remove(appointment_id)
+    availability_cache.invalidate(appointment["hairdresser_id"])
     return {"message": "Appointment deleted"}
 
 @api_router.delete("/admin/appointments-cancelled/all")
@@ -1233,8 +2807,8 @@ async def create_manual_appointment(data: ManualAppointmentCreate, current_user:
         raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
     
     # Get service and hairdresser names
-    service = await db.services.find_one({"id": data.service_id}, {"_id": 0})
-    hairdresser = await db.hairdressers.find_one({"id": data.hairdresser_id}, {"_id": 0})
+    service = await catalog.find("services", data.service_id)
+    hairdresser = await catalog.find("hairdressers", data.hairdresser_id)
     
     if not service:
         raise HTTPException(status_code=404, detail="Servizio non trovato")
@@ -1242,6 +2816,10 @@ async def create_manual_appointment(data: ManualAppointmentCreate, current_user:
         raise HTTPException(status_code=404, detail="Parrucchiere non trovato")
     
     appointment_id = str(uuid.uuid4())
+    times = appointment_times(data.date_time, service["duration_minutes"])
+    if not await claim_slot(data.hairdresser_id, appointment_id, times["date_time"], times["end_time"]):
+        raise HTTPException(status_code=400, detail="Questo orario non è disponibile. Seleziona un altro orario.")
+    
     appointment_doc = {
         "id": appointment_id,
         "user_id": f"manual_{appointment_id[:8]}",  # Manual appointments have no real user
@@ -1252,16 +2830,21 @@ async def create_manual_appointment(data: ManualAppointmentCreate, current_user:
         "service_name": service["name"],
         "hairdresser_id": data.hairdresser_id,
         "hairdresser_name": hairdresser["name"],
-        "date_time": data.date_time.isoformat(),
+        **times,
         "status": "confirmed",  # Manual appointments are auto-confirmed
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc),
         "is_manual": True
     }
     
-    await db.appointments.insert_one(appointment_doc)
+    try:
+        await db.appointments.insert_one(appointment_doc)
+    except Exception:
+        await release_slot([appointment_id])
+        raise
+    appointment_index.add(appointment_id, data.hairdresser_id, data.date_time, service["duration_minutes"])
+    availability_cache.invalidate(data.hairdresser_id)
     
     appointment_doc["date_time"] = data.date_time
-    appointment_doc["created_at"] = datetime.fromisoformat(appointment_doc["created_at"])
     
     return Appointment(**appointment_doc)
 
@@ -1274,6 +2857,7 @@ async def create_service(service_data: ServiceCreate, current_user: dict = Depen
         **service_data.model_dump()
     }
     await db.services.insert_one(service_doc)
+    await catalog.bump("services")
     return Service(**service_doc)
 
 @api_router.put("/admin/services/{service_id}", response_model=Service)
@@ -1286,6 +2870,8 @@ async def update_service(service_id: str, update_data: ServiceUpdate, current_us
     if update_dict:
         await db.services.update_one({"id": service_id}, {"$set": update_dict})
         service.update(update_dict)
+        await catalog.bump("services")
+        availability_cache.invalidate()
     
     return Service(**service)
 
@@ -1294,6 +2880,8 @@ async def delete_service(service_id: str, current_user: dict = Depends(get_admin
     result = await db.services.delete_one({"id": service_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
+    await catalog.bump("services")
+    availability_cache.invalidate()
     return {"message": "Service deleted"}
 
 # Admin Hairdressers Management
@@ -1305,6 +2893,7 @@ async def create_hairdresser(hairdresser_data: HairdresserCreate, current_user:
         **hairdresser_data.model_dump()
     }
     await db.hairdressers.insert_one(hairdresser_doc)
+    await catalog.bump("hairdressers")
     return Hairdresser(**hairdresser_doc)
 
 @api_router.put("/admin/hairdressers/{hairdresser_id}", response_model=Hairdresser)
@@ -1317,6 +2906,7 @@ async def update_hairdresser(hairdresser_id: str, update_data: HairdresserUpdate
     if update_dict:
         await db.hairdressers.update_one({"id": hairdresser_id}, {"$set": update_dict})
         hairdresser.update(update_dict)
+        await catalog.bump("hairdressers")
     
     return Hairdresser(**hairdresser)
 
@@ -1325,114 +2915,14 @@ async def delete_hairdresser(hairdresser_id: str, current_user: dict = Depends(g
     result = await db.hairdressers.delete_one({"id": hairdresser_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Hairdresser not found")
+    await catalog.bump("hairdressers")
     return {"message": "Hairdresser deleted"}
 
 # Admin Settings Management
 @api_router.get("/settings", response_model=Settings)
-async def get_settings():
-    settings = await db.settings.find_one({"id": "app_settings"}, {"_id": 0})
-    if not settings:
-        # Return default settings
-        default_settings = {
-            "id": "app_settings",
-            "hero_title": "Il Tuo Salone, Sempre Disponibile",
-            "hero_subtitle": "",
-            "hero_description": "Prenota il tuo appuntamento in pochi secondi. Ricevi notifiche e promemoria. Gestisci tutto dal tuo telefono.",
-            "hero_image_url": "https://images.pexels.com/photos/7195799/pexels-photo-7195799.jpeg?auto=compress&cs=tinysrgb&dpr=2&h=650&w=940",
-            "working_days": [1, 2, 3, 4, 5, 6],  # Monday to Saturday
-            "opening_time": "09:00",
-            "closing_time": "19:00",
-            "time_slots": [
-                "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-                "14:00", "14:30", "15:00", "15:30", "16:00", "16:30",
-                "17:00", "17:30", "18:00"
-            ],
-            "admin_phone": "",
-            "calendar_limit_type": "always",
-            "calendar_limit_value": 0,
-            "salon_name": "parrucco..",
-            "feature1_title": "Prenota Online",
-            "feature1_desc": "Scegli data e ora per il tuo appuntamento",
-            "feature2_title": "Scegli il Parrucchiere",
-            "feature2_desc": "Prenota con il tuo parrucchiere preferito",
-            "feature3_title": "Promemoria Automatici",
-            "feature3_desc": "Ricevi notifiche prima del tuo appuntamento",
-            "feature4_title": "Gestione Facile",
-            "feature4_desc": "Modifica o cancella i tuoi appuntamenti",
-            "cta_title": "Pronto a Trasformare il Tuo Look?",
-            "cta_subtitle": "Registrati ora e prenota il tuo primo appuntamento",
-            "app_section_title": "Scarica l'App sul Tuo Telefono",
-            "app_section_desc": "Installa parrucco.. sul tuo dispositivo per un accesso ancora più rapido. Funziona anche offline!"
-        }
-        return Settings(**default_settings)
-    
-    # Ensure new fields exist (for backward compatibility)
-    if "calendar_limit_type" not in settings:
-        settings["calendar_limit_type"] = "always"
-    if "calendar_limit_value" not in settings:
-        settings["calendar_limit_value"] = 0
-    if "salon_name" not in settings:
-        settings["salon_name"] = "parrucco.."
-    if "feature1_title" not in settings:
-        settings["feature1_title"] = "Prenota Online"
-    if "feature1_desc" not in settings:
-        settings["feature1_desc"] = "Scegli data e ora per il tuo appuntamento"
-    if "feature2_title" not in settings:
-        settings["feature2_title"] = "Scegli il Parrucchiere"
-    if "feature2_desc" not in settings:
-        settings["feature2_desc"] = "Prenota con il tuo parrucchiere preferito"
-    if "feature3_title" not in settings:
-        settings["feature3_title"] = "Promemoria Automatici"
-    if "feature3_desc" not in settings:
-        settings["feature3_desc"] = "Ricevi notifiche prima del tuo appuntamento"
-    if "feature4_title" not in settings:
-        settings["feature4_title"] = "Gestione Facile"
-    if "feature4_desc" not in settings:
-        settings["feature4_desc"] = "Modifica o cancella i tuoi appuntamenti"
-    if "cta_title" not in settings:
-        settings["cta_title"] = "Pronto a Trasformare il Tuo Look?"
-    if "cta_subtitle" not in settings:
-        settings["cta_subtitle"] = "Registrati ora e prenota il tuo primo appuntamento"
-    if "app_section_title" not in settings:
-        settings["app_section_title"] = "Scarica l'App sul Tuo Telefono"
-    if "app_section_desc" not in settings:
-        settings["app_section_desc"] = "Installa parrucco.. sul tuo dispositivo per un accesso ancora più rapido. Funziona anche offline!"
-    
-    # Ensure hero_image_url exists (for backward compatibility)
-    if "hero_image_url" not in settings:
-        settings["hero_image_url"] = "https://images.pexels.com/photos/7195799/pexels-photo-7195799.jpeg?auto=compress&cs=tinysrgb&dpr=2&h=650&w=940"
-        # Update database with new field
-        await db.settings.update_one(
-            {"id": "app_settings"},
-            {"$set": {"hero_image_url": settings["hero_image_url"]}}
-        )
-    
-    # Ensure admin_phone exists (for backward compatibility)
-    if "admin_phone" not in settings:
-        settings["admin_phone"] = ""
-        await db.settings.update_one(
-            {"id": "app_settings"},
-            {"$set": {"admin_phone": ""}}
-        )
-    
-    # Ensure working_days exists
-    if "working_days" not in settings:
-        settings["working_days"] = [1, 2, 3, 4, 5, 6]
-        await db.settings.update_one(
-            {"id": "app_settings"},
-            {"$set": {"working_days": [1, 2, 3, 4, 5, 6]}}
-        )
-    
-    # Ensure opening/closing times exist
-    if "opening_time" not in settings:
-        settings["opening_time"] = "09:00"
-        settings["closing_time"] = "19:00"
-        await db.settings.update_one(
-            {"id": "app_settings"},
-            {"$set": {"opening_time": "09:00", "closing_time": "19:00"}}
-        )
-    
-    return Settings(**settings)
+async def get_settings(request: Request):
+    # Migration 0007 completed the document; the JSON body is built once per settings version
+    return await catalog_response(request, "settings", render_settings)
 
 @api_router.put("/admin/settings", response_model=Settings)
 async def update_settings(update_data: SettingsUpdate, current_user: dict = Depends(get_admin_user)):
@@ -1441,36 +2931,24 @@ async def update_settings(update_data: SettingsUpdate, current_user: dict = Depe
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
     
     if not settings:
-        # Create new settings
-        settings_doc = {
-            "id": "app_settings",
-            "hero_title": update_data.hero_title or "Il Tuo Salone, Sempre Disponibile",
-            "hero_subtitle": update_data.hero_subtitle or "",
-            "hero_description": update_data.hero_description or "Prenota il tuo appuntamento in pochi secondi.",
-            "hero_image_url": update_data.hero_image_url or "https://images.pexels.com/photos/7195799/pexels-photo-7195799.jpeg?auto=compress&cs=tinysrgb&dpr=2&h=650&w=940",
-            "admin_phone": update_data.admin_phone or "",
-            "working_days": update_data.working_days or [1, 2, 3, 4, 5, 6],
-            "opening_time": update_data.opening_time or "09:00",
-            "closing_time": update_data.closing_time or "19:00",
-            "time_slots": update_data.time_slots or [
-                "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-                "14:00", "14:30", "15:00", "15:30", "16:00", "16:30",
-                "17:00", "17:30", "18:00"
-            ]
-        }
+        # Normally created by migration 0007
+        settings_doc = {**DEFAULT_SETTINGS, **update_dict, "schema_version": SETTINGS_SCHEMA_VERSION}
         await db.settings.insert_one(settings_doc)
+        await catalog.bump("settings")
+        availability_cache.invalidate()
         return Settings(**settings_doc)
     else:
         if update_dict:
             await db.settings.update_one({"id": "app_settings"}, {"$set": update_dict})
             settings.update(update_dict)
+            await catalog.bump("settings")
+            availability_cache.invalidate()
         return Settings(**settings)
 
 # Closures (giorni di chiusura) endpoints
 @api_router.get("/closures")
-async def get_closures():
-    closures = await db.closures.find({}, {"_id": 0}).to_list(1000)
-    return closures
+async def get_closures(request: Request):
+    return await catalog_response(request, "closures", render_documents)
 
 @api_router.post("/admin/closures", response_model=Closure)
 async def create_closure(closure_data: ClosureCreate, current_user: dict = Depends(get_admin_user)):
@@ -1480,6 +2958,8 @@ async def create_closure(closure_data: ClosureCreate, current_user: dict = Depen
         "reason": closure_data.reason
     }
     await db.closures.insert_one(closure_doc)
+    await catalog.bump("closures")
+    availability_cache.invalidate()
     return Closure(**closure_doc)
 
 @api_router.delete("/admin/closures/{closure_id}")
@@ -1487,8 +2967,67 @@ async def delete_closure(closure_id: str, current_user: dict = Depends(get_admin
     result = await db.closures.delete_one({"id": closure_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Closure not found")
+    await catalog.bump("closures")
+    availability_cache.invalidate()
     return {"message": "Chiusura eliminata"}
 
+# Bootstrap bundle for the booking flow
+# Everything the frontend needs before the first render in one response. Each
+# catalog section comes with its version (the ETag value of its own route); sections
+# listed in ?known=section:version,... with the current version are left out.
+# ?include=me adds the caller's profile and appointments; an invalid or expired
+# token only drops that section, the public ones are always served.
+BOOTSTRAP_RENDERERS = {
+    "settings": render_settings,
+    "services": render_services,
+    "hairdressers": render_hairdressers,
+    "closures": render_documents,
+}
+render_appointments = render_list(Appointment)
+
+async def bootstrap_user_section(current_user: dict) -> bytes:
+    user, appointments = await asyncio.gather(
+        db.users.find_one({"id": current_user["sub"]}, {"_id": 0, "password_hash": 0}),
+        db.appointments.find({"user_id": current_user["sub"]}, {"_id": 0}).sort("date_time", -1).to_list(100)
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return b'{"user":' + User(**user).model_dump_json().encode() + b',"appointments":' + render_appointments(appointments) + b'}'
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(known: Optional[str] = None, include: Optional[str] = None, credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Settings, services, hairdressers, closures and, on request, the caller's profile and appointments"""
+    known_versions = dict(item.split(":", 1) for item in known.split(",") if ":" in item) if known else {}
+    current_user = None
+    if credentials and include and "me" in include.split(","):
+        try:
+            current_user = await get_current_user(credentials)
+        except HTTPException:
+            pass
+    
+    sections = list(BOOTSTRAP_RENDERERS)
+    results = await asyncio.gather(
+        *[catalog.rendered(section, BOOTSTRAP_RENDERERS[section]) for section in sections],
+        *([bootstrap_user_section(current_user)] if current_user else [])
+    )
+    
+    # The section bodies are already JSON: the bundle is assembled without re-encoding them
+    versions = {}
+    parts = []
+    for section, (body, content_hash) in zip(sections, results):
+        versions[section] = content_hash
+        if known_versions.get(section) != versions[section]:
+            parts.append(b'"' + section.encode() + b'":' + body)
+    if current_user:
+        parts.append(b'"me":' + results[-1])
+    parts.insert(0, b'"versions":' + json.dumps(versions).encode())
+    
+    return Response(
+        content=b"{" + b",".join(parts) + b"}",
+        media_type="application/json",
+        headers={"Cache-Control": "private, no-cache"}
+    )
+
 # Seed data endpoint (for development)
 @api_router.post("/seed")
 async def seed_data():
@@ -1498,7 +3037,7 @@ async def seed_data():
         admin_user = {
             "id": str(uuid.uuid4()),
             "email": "admin@parrucco.it",
-            "password_hash": hash_password("admin123"),
+            "password_hash": await hash_password("admin123"),
             "name": "Amministratore",
             "phone": "+393331234567",
             "is_admin": True,
@@ -1547,6 +3086,7 @@ async def seed_data():
             }
         ]
         await db.services.insert_many(services)
+        await catalog.bump("services")
     
     # Create hairdressers
     hairdressers_count = await db.hairdressers.count_documents({})
@@ -1569,11 +3109,277 @@ async def seed_data():
             }
         ]
         await db.hairdressers.insert_many(hairdressers)
+        await catalog.bump("hairdressers")
     
     return {"message": "Database seeded successfully"}
 
+# Admin - Metrics
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: dict = Depends(get_admin_user)):
+    return {
+        "mongo_round_trips": mongo_round_trips.total,
+        "availability_cache": availability_cache.stats(),
+        "appointment_index_days": appointment_index.size(),
+        "token_cache": token_cache.stats(),
+        "catalog_versions": catalog.versions(),
+        "push_queue": await db.push_queue.count_documents({}),
+        "vapid_signatures": vapid_headers.signatures
+    }
+
+@api_router.get("/admin/indexes")
+async def get_indexes(current_user: dict = Depends(get_admin_user)):
+    """Report missing or unused indexes of the registry"""
+    return await get_index_report()
+
+# Health check of the API process
+@api_router.get("/health")
+async def health_check():
+    if not await mongo_healthy():
+        raise HTTPException(status_code=503, detail="MongoDB non raggiungibile")
+    health = {"status": "ok", "mongo": True, "schedulers": RUN_SCHEDULERS}
+    if RUN_SCHEDULERS:
+        health["background_jobs"] = background_jobs_health()
+    return health
+
+# Stub push service for tests: subscriptions pointing at /api/push/stub/<token>
+# are "delivered" here. ?status=410 simulates an expired subscription.
+PUSH_STUB_ENABLED = os.environ.get('PUSH_STUB_ENABLED', 'false').lower() == 'true'
+
+if PUSH_STUB_ENABLED:
+    push_stub_deliveries: Dict[str, int] = {}
+
+    @api_router.post("/push/stub/{token}")
+    async def push_stub_receive(token: str, status: int = 201):
+        push_stub_deliveries[token] = push_stub_deliveries.get(token, 0) + 1
+        return Response(status_code=status)
+
+    @api_router.get("/push/stub/{token}")
+    async def push_stub_deliveries_count(token: str):
+        return {"deliveries": push_stub_deliveries.get(token, 0)}
+
 app.include_router(api_router)
 
+if DB_ROUND_TRIP_HEADER:
+    @app.middleware("http")
+    async def count_db_round_trips(request: Request, call_next):
+        """Expose the number of Mongo commands issued by each request (benchmarks)"""
+        counter = [0]
+        token = request_round_trips.set(counter)
+        try:
+            response = await call_next(request)
+        finally:
+            request_round_trips.reset(token)
+        response.headers["X-DB-Round-Trips"] = str(counter[0])
+        return response
+
+# Rate limiting
+# Token buckets per client IP and per email on the auth routes, checked before
+# the request reaches the handler (and bcrypt). Buckets live in this process;
+# with RATE_LIMIT_SHARED=true they are kept in db.rate_limits so every worker
+# sees the same counts. Rules are "capacity/period_seconds", e.g. "5/60".
+# Failures-only rules still reject up front, but give the token back when the
+# request succeeds, so legitimate logins never use up the budget.
+class RateLimitRule:
+    def __init__(self, spec: str, failures_only: bool = False):
+        capacity, period = spec.split("/")
+        self.capacity = float(capacity)
+        self.period = float(period)
+        self.refill_per_second = self.capacity / self.period
+        self.failures_only = failures_only
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', 'false').lower() == 'true'
+# Proxies in front of the app: the client IP is that many entries from the end of
+# X-Forwarded-For. The deployment has one (the ingress); without it every client would
+# share the ingress address and its buckets. Use 0 when clients reach uvicorn directly,
+# where the header can be forged, and the number of proxies when they are chained.
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '1'))
+RATE_LIMIT_RULES: Dict[str, Dict[str, RateLimitRule]] = {
+    "/api/auth/login": {
+        "ip": RateLimitRule(os.environ.get('RATE_LIMIT_LOGIN_IP', '20/60'), failures_only=True),
+        "email": RateLimitRule(os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '5/60'), failures_only=True),
+    },
+    "/api/auth/register": {
+        "ip": RateLimitRule(os.environ.get('RATE_LIMIT_REGISTER_IP', '30/3600')),
+        "email": RateLimitRule(os.environ.get('RATE_LIMIT_REGISTER_EMAIL', '3/3600')),
+    },
+}
+RATE_LIMIT_MAX_BUCKETS = 100000
+
+class TokenBuckets:
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        # key -> (tokens, updated_at)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str, rule: RateLimitRule) -> float:
+        """Consume one token; returns 0 when allowed, otherwise the seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (rule.capacity, now))
+        tokens = min(rule.capacity, tokens + (now - updated_at) * rule.refill_per_second)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rule.refill_per_second
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_buckets:
+            self._prune(now)
+        return 0
+
+    def refund(self, key: str, rule: RateLimitRule):
+        if key in self._buckets:
+            tokens, updated_at = self._buckets[key]
+            self._buckets[key] = (min(rule.capacity, tokens + 1), updated_at)
+
+    def _prune(self, now: float):
+        # Buckets idle for the longest period are back at capacity: same as absent
+        idle_seconds = max(rule.period for rules in RATE_LIMIT_RULES.values() for rule in rules.values())
+        self._buckets = {
+            key: (tokens, updated_at) for key, (tokens, updated_at) in self._buckets.items()
+            if now - updated_at < idle_seconds
+        }
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.pop(next(iter(self._buckets)))
+
+rate_limit_buckets = TokenBuckets(RATE_LIMIT_MAX_BUCKETS)
+
+async def take_shared_token(key: str, rule: RateLimitRule) -> float:
+    """Same as TokenBuckets.take, computed atomically by Mongo with the server clock"""
+    elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+    bucket = await db.rate_limits.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": {"$min": [rule.capacity, {"$add": [
+                {"$ifNull": ["$tokens", rule.capacity]},
+                {"$multiply": [elapsed, rule.refill_per_second]}
+            ]}]}}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", 1]},
+                "updated_at": "$$NOW",
+                "expires_at": {"$add": ["$$NOW", int(rule.period * 1000)]}
+            }},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if bucket["allowed"]:
+        return 0
+    return (1 - bucket["tokens"]) / rule.refill_per_second
+
+async def refund_shared_token(key: str, rule: RateLimitRule):
+    await db.rate_limits.update_one(
+        {"_id": key},
+        [{"$set": {"tokens": {"$min": [rule.capacity, {"$add": ["$tokens", 1]}]}}}]
+    )
+
+def client_ip(scope) -> str:
+    headers = dict(scope["headers"])
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and RATE_LIMIT_PROXY_HOPS > 0:
+        addresses = [address.strip() for address in forwarded.decode("latin-1").split(",")]
+        return addresses[max(0, len(addresses) - RATE_LIMIT_PROXY_HOPS)]
+    return scope["client"][0] if scope.get("client") else "unknown"
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware: the body is read once to find the email, then replayed to the app"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rules = RATE_LIMIT_RULES.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+        
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        
+        keys = {"ip": client_ip(scope)}
+        try:
+            email = json.loads(body).get("email")
+            if isinstance(email, str):
+                keys["email"] = email.strip().lower()
+        except (ValueError, AttributeError):
+            pass
+        
+        retry_after = 0
+        taken = []
+        for kind, value in keys.items():
+            rule = rules.get(kind)
+            if rule is None:
+                continue
+            key = f"{scope['path']}|{kind}|{value}"
+            if RATE_LIMIT_SHARED:
+                retry_after = await take_shared_token(key, rule)
+            else:
+                retry_after = rate_limit_buckets.take(key, rule)
+            if retry_after:
+                break
+            taken.append((key, rule))
+        
+        if retry_after:
+            # Tokens of the rules that passed are given back: the request is not served
+            for key, rule in taken:
+                if RATE_LIMIT_SHARED:
+                    await refund_shared_token(key, rule)
+                else:
+                    rate_limit_buckets.refund(key, rule)
+            logging.warning(f"Rate limit exceeded on {scope['path']} for {kind}")
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Troppi tentativi, riprova tra qualche minuto"},
+                headers={"Retry-After": str(int(retry_after) + 1)}
+            )
+            await response(scope, receive, send)
+            return
+        
+        replayed = False
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+        
+        response_status = 500
+        async def send_and_record(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
+        
+        await self.app(scope, replay, send_and_record)
+        
+        if response_status < 400:
+            for key, rule in taken:
+                if not rule.failures_only:
+                    continue
+                if RATE_LIMIT_SHARED:
+                    await refund_shared_token(key, rule)
+                else:
+                    rate_limit_buckets.refund(key, rule)
+
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Compression of response bodies above COMPRESSION_MIN_BYTES; small bodies are
+# not worth the CPU. gzip level 9 costs about three times level 5 for a 2%
+# smaller body (see benchmarks/json_serialization.py). brotli-asgi, when
+# installed, adds brotli for the browsers that accept it.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '5'))
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES, compresslevel=COMPRESSION_LEVEL)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
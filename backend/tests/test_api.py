@@ -5,9 +5,16 @@ Tests: Auth, Services, Hairdressers, Availability, Appointments, Admin
 import pytest
 import requests
 import os
-from datetime import datetime, timedelta
+import bcrypt
+import jwt
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+# Database of the backend, for the tests that inspect stored documents
+MONGO_URL = os.environ.get('MONGO_URL', '')
+DB_NAME = os.environ.get('DB_NAME', '')
 
 # Test credentials
 ADMIN_EMAIL = "admin@parrucco.it"
@@ -34,6 +41,32 @@ class TestHealthAndSettings:
         assert len(data["time_slots"]) > 0
         print(f"✓ Settings endpoint working - {len(data['time_slots'])} time slots configured")
 
+    def test_settings_complete_and_preserialized(self):
+        """GET /api/settings should serve the migrated document as the same cached body"""
+        first = requests.get(f"{BASE_URL}/api/settings")
+        second = requests.get(f"{BASE_URL}/api/settings")
+        assert first.status_code == 200
+        assert first.headers["content-type"].startswith("application/json")
+        assert first.headers["ETag"] == second.headers["ETag"]
+        assert first.content == second.content
+
+        data = first.json()
+        for field in ("salon_name", "time_slots", "working_days", "hero_title", "hero_subtitle", "app_section_title"):
+            assert field in data, f"{field} missing from settings"
+        print(f"✓ Settings complete and pre-serialized - ETag {first.headers['ETag']}")
+
+    def test_health_endpoint(self):
+        """GET /api/health should report MongoDB and the background jobs"""
+        response = requests.get(f"{BASE_URL}/api/health")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["status"] == "ok"
+        assert data["mongo"] is True
+        if data["schedulers"]:
+            assert set(data["background_jobs"]["jobs"]) == {"notifications", "cleanup"}
+        print(f"✓ Health endpoint working - schedulers in API process: {data['schedulers']}")
+
 
 class TestPublicEndpoints:
     """Test public endpoints (no auth required)"""
@@ -72,6 +105,56 @@ class TestPublicEndpoints:
         assert "specialties" in hairdresser
         print(f"✓ Hairdressers endpoint working - {len(data)} hairdressers found")
         return data
+    
+    @pytest.mark.parametrize("path", ["/api/settings", "/api/services", "/api/hairdressers", "/api/closures"])
+    def test_conditional_get(self, path):
+        """Catalog endpoints send an ETag and answer 304 when it still matches"""
+        response = requests.get(f"{BASE_URL}{path}")
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag, "Missing ETag header"
+        assert etag.startswith('W/"'), "ETag must be weak: the same one is sent for gzip bodies"
+        assert "Cache-Control" in response.headers
+        
+        response = requests.get(f"{BASE_URL}{path}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        
+        response = requests.get(f"{BASE_URL}{path}", headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+        print(f"✓ {path} conditional GET - ETag {etag}")
+    
+    def test_bootstrap_bundle(self):
+        """GET /api/bootstrap returns every catalog section with its version and skips known ones"""
+        response = requests.get(f"{BASE_URL}/api/bootstrap")
+        assert response.status_code == 200
+        data = response.json()
+        for section in ["settings", "services", "hairdressers", "closures"]:
+            assert section in data
+            assert section in data["versions"]
+        assert "me" not in data
+        assert data["services"] == requests.get(f"{BASE_URL}/api/services").json()
+        
+        known = f"services:{data['versions']['services']},hairdressers:{data['versions']['hairdressers']}"
+        response = requests.get(f"{BASE_URL}/api/bootstrap", params={"known": known})
+        data = response.json()
+        assert "services" not in data and "hairdressers" not in data
+        assert "settings" in data
+        
+        # A stale token must not break the public sections
+        response = requests.get(f"{BASE_URL}/api/bootstrap", params={"include": "me"},
+            headers={"Authorization": "Bearer expired-or-revoked"})
+        assert response.status_code == 200
+        assert "services" in response.json() and "me" not in response.json()
+        print(f"✓ Bootstrap bundle - versions {data['versions']}")
+    
+    def test_large_responses_compressed(self):
+        """Bodies above the compression threshold are gzip encoded when the client accepts it"""
+        response = requests.get(f"{BASE_URL}/api/bootstrap", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers.get("Content-Encoding") == "gzip"
+        assert "services" in response.json()
+        print(f"✓ Bootstrap bundle gzip encoded")
 
 
 class TestAuthentication:
@@ -130,6 +213,86 @@ class TestAuthentication:
         assert response.status_code == 401
         print("✓ Invalid credentials correctly rejected")
 
+    def test_logout_revokes_only_current_token(self):
+        """POST /api/auth/logout should invalidate the token immediately, other sessions stay valid"""
+        tokens = []
+        for _ in range(2):
+            response = requests.post(f"{BASE_URL}/api/auth/login", json={
+                "email": ADMIN_EMAIL,
+                "password": ADMIN_PASSWORD
+            })
+            assert response.status_code == 200
+            tokens.append(response.json()["access_token"])
+        assert tokens[0] != tokens[1]
+        headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+
+        assert requests.get(f"{BASE_URL}/api/appointments/my", headers=headers[0]).status_code == 200
+        response = requests.post(f"{BASE_URL}/api/auth/logout", headers=headers[0])
+        assert response.status_code == 200
+
+        response = requests.get(f"{BASE_URL}/api/appointments/my", headers=headers[0])
+        assert response.status_code == 401
+        assert requests.get(f"{BASE_URL}/api/appointments/my", headers=headers[1]).status_code == 200
+        print("✓ Logout revoked the current token only")
+
+    def test_login_rate_limited_per_email(self):
+        """Repeated failed logins for one email get 429 with Retry-After, other emails are unaffected"""
+        email = f"rate_limit_{datetime.now().strftime('%Y%m%d%H%M%S%f')}@test.com"
+        statuses = []
+        for _ in range(6):
+            response = requests.post(f"{BASE_URL}/api/auth/login", json={
+                "email": email,
+                "password": "wrongpassword"
+            })
+            statuses.append(response.status_code)
+        assert statuses[-1] == 429, f"Expected the burst to be throttled: {statuses}"
+        assert "Retry-After" in response.headers
+
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        assert response.status_code == 200
+        print(f"✓ Failed login burst throttled: {statuses}")
+
+    def test_login_upgrades_weak_password_hash(self):
+        """A bcrypt hash with fewer rounds than configured is rehashed on the next login"""
+        if not MONGO_URL or not DB_NAME:
+            pytest.skip("MONGO_URL and DB_NAME of the backend are not set")
+        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=3000)
+        try:
+            client.admin.command("ping")
+        except PyMongoError:
+            pytest.skip("MongoDB of the backend not reachable")
+        users = client[DB_NAME].users
+
+        email = f"rehash_{datetime.now().strftime('%Y%m%d%H%M%S%f')}@test.com"
+        response = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "email": email,
+            "password": TEST_USER_PASSWORD,
+            "name": TEST_USER_NAME,
+            "phone": TEST_USER_PHONE
+        })
+        assert response.status_code == 200
+        # Stored as by an older release: bcrypt with the minimum cost
+        weak_hash = bcrypt.hashpw(TEST_USER_PASSWORD.encode(), bcrypt.gensalt(rounds=4)).decode()
+        users.update_one({"email": email}, {"$set": {"password_hash": weak_hash}})
+
+        for _ in range(2):
+            response = requests.post(f"{BASE_URL}/api/auth/login", json={
+                "email": email,
+                "password": TEST_USER_PASSWORD
+            })
+            assert response.status_code == 200
+        new_hash = users.find_one({"email": email})["password_hash"]
+        client.close()
+
+        rounds = int(new_hash.split("$")[2])
+        if rounds == 4:
+            pytest.skip("Backend configured with BCRYPT_ROUNDS=4: nothing to upgrade")
+        assert bcrypt.checkpw(TEST_USER_PASSWORD.encode(), new_hash.encode())
+        print(f"✓ Weak hash upgraded on login - bcrypt rounds 4 -> {rounds}")
+
 
 class TestAvailability:
     """Test availability endpoint"""
@@ -179,6 +342,97 @@ class TestAvailability:
         assert response.status_code == 404
         print("✓ Invalid service correctly rejected in availability check")
 
+    def test_availability_invalid_hairdresser(self):
+        """POST /api/availability with an unknown hairdresser should fail"""
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        tomorrow = datetime.now() + timedelta(days=1)
+        
+        response = requests.post(f"{BASE_URL}/api/availability", json={
+            "date": tomorrow.strftime('%Y-%m-%d'),
+            "service_id": services[0]["id"],
+            "hairdresser_id": "invalid-hairdresser-id"
+        })
+        assert response.status_code == 404
+        print("✓ Invalid hairdresser correctly rejected in availability check")
+
+    def test_availability_matrix_matches_single_checks(self):
+        """POST /api/availability/matrix should agree with /api/availability for every hairdresser"""
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+
+        tomorrow = datetime.now() + timedelta(days=1)
+        if tomorrow.weekday() == 6:  # Sunday
+            tomorrow = tomorrow + timedelta(days=1)
+        date_str = tomorrow.strftime('%Y-%m-%d')
+
+        response = requests.post(f"{BASE_URL}/api/availability/matrix", json={
+            "date": date_str,
+            "service_id": services[0]["id"]
+        })
+        assert response.status_code == 200
+
+        data = response.json()
+        assert len(data["days"]) == 1
+        assert set(data["hairdresser_ids"]) == set(h["id"] for h in hairdressers)
+
+        day = data["days"][0]
+        for hairdresser in hairdressers:
+            single = requests.post(f"{BASE_URL}/api/availability", json={
+                "date": date_str,
+                "service_id": services[0]["id"],
+                "hairdresser_id": hairdresser["id"]
+            }).json()
+            row = day["availability"][hairdresser["id"]]
+            assert len(row) == len(data["time_slots"])
+            free = [slot for slot, is_free in zip(data["time_slots"], row) if is_free]
+            assert free == single["available_slots"], f"Matrix row differs for {hairdresser['name']}"
+        print(f"✓ Availability matrix matches single checks for {len(hairdressers)} hairdressers")
+
+    def test_availability_matrix_requires_date(self):
+        """POST /api/availability/matrix without date or range should fail"""
+        services = requests.get(f"{BASE_URL}/api/services").json()
+
+        response = requests.post(f"{BASE_URL}/api/availability/matrix", json={
+            "service_id": services[0]["id"]
+        })
+        assert response.status_code == 400
+        print("✓ Matrix request without dates correctly rejected")
+
+    def test_availability_matrix_closed_days(self):
+        """Sundays and past days come back closed, as in days-status"""
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        today = datetime.now()
+        next_sunday = today + timedelta(days=(6 - today.weekday()) % 7 or 7)
+
+        response = requests.post(f"{BASE_URL}/api/availability/matrix", json={
+            "service_id": services[0]["id"],
+            "start_date": (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+            "end_date": next_sunday.strftime('%Y-%m-%d')
+        })
+        assert response.status_code == 200
+        days = {day["date"]: day for day in response.json()["days"]}
+        assert days[(today - timedelta(days=1)).strftime('%Y-%m-%d')]["closed"]
+        assert days[next_sunday.strftime('%Y-%m-%d')]["closed"]
+        print("✓ Matrix marks past days and non-working days closed")
+
+    def test_availability_matrix_rejects_bad_input(self):
+        """Malformed dates get 400, unknown hairdressers 404"""
+        services = requests.get(f"{BASE_URL}/api/services").json()
+
+        response = requests.post(f"{BASE_URL}/api/availability/matrix", json={
+            "service_id": services[0]["id"],
+            "date": "2026-13-01"
+        })
+        assert response.status_code == 400
+
+        response = requests.post(f"{BASE_URL}/api/availability/matrix", json={
+            "service_id": services[0]["id"],
+            "date": (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'),
+            "hairdresser_ids": ["invalid-hairdresser-id"]
+        })
+        assert response.status_code == 404
+        print("✓ Matrix rejects malformed dates and unknown hairdressers")
+
 
 class TestAppointments:
     """Test appointment CRUD operations"""
@@ -267,6 +521,40 @@ class TestAppointments:
         assert response.status_code == 400
         print("✓ Past date appointment correctly rejected")
 
+    def test_offset_date_time_round_trip(self):
+        """An appointment booked with a UTC offset is stored and filtered as the same instant"""
+        login = requests.post(f"{BASE_URL}/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+
+        # 00:30 in Rome summer time is 22:30 UTC of the previous day
+        local_day = (datetime.now() + timedelta(days=21)).date()
+        booked_at = datetime(local_day.year, local_day.month, local_day.day, 0, 30, tzinfo=timezone(timedelta(hours=2)))
+        response = requests.post(f"{BASE_URL}/api/appointments",
+            json={
+                "service_id": services[0]["id"],
+                "hairdresser_id": hairdressers[0]["id"],
+                "date_time": booked_at.isoformat()
+            },
+            headers=headers
+        )
+        assert response.status_code == 200, f"Booking failed: {response.text}"
+        appointment = response.json()
+        assert datetime.fromisoformat(appointment["date_time"].replace("Z", "+00:00")) == booked_at
+
+        utc_day = booked_at.astimezone(timezone.utc).strftime('%Y-%m-%d')
+        listed = requests.get(f"{BASE_URL}/api/admin/appointments?date={utc_day}", headers=headers).json()
+        matches = [apt for apt in listed if apt["id"] == appointment["id"]]
+        assert len(matches) == 1, f"Appointment missing from its UTC day {utc_day}"
+        assert datetime.fromisoformat(matches[0]["date_time"].replace("Z", "+00:00")) == booked_at
+
+        listed = requests.get(f"{BASE_URL}/api/admin/appointments?date={local_day.isoformat()}", headers=headers).json()
+        assert appointment["id"] not in [apt["id"] for apt in listed]
+        print(f"✓ Offset date_time round-trips as {appointment['date_time']}")
+
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment['id']}", headers=headers)
+
 
 class TestAdminEndpoints:
     """Test admin-only endpoints"""
@@ -292,6 +580,18 @@ class TestAdminEndpoints:
         print(f"✓ Admin appointments endpoint working - {len(data)} total appointments")
         return data
     
+    def test_admin_index_report(self, admin_token):
+        """GET /api/admin/indexes should report every registry index as present"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=headers)
+        assert response.status_code == 200
+        
+        data = response.json()
+        for collection in ["users", "appointments", "sent_notifications"]:
+            assert collection in data
+            assert data[collection]["missing"] == [], f"Missing indexes on {collection}: {data[collection]['missing']}"
+        print(f"✓ Index report working - no missing indexes")
+    
     def test_admin_filter_by_date(self, admin_token):
         """GET /api/admin/appointments with date filter"""
         headers = {"Authorization": f"Bearer {admin_token}"}
@@ -380,6 +680,43 @@ class TestAdminEndpoints:
         assert response.status_code == 403
         print("✓ Non-admin access correctly denied")
 
+    def test_non_admin_token_rejected_on_client_routes(self):
+        """Client management routes answer 403 to a user token and change nothing"""
+        unique_email = f"regular_{datetime.now().strftime('%Y%m%d%H%M%S%f')}@test.com"
+        reg_response = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "email": unique_email,
+            "password": "testpass",
+            "name": "Regular User",
+            "phone": "+393331234567"
+        })
+        assert reg_response.status_code == 200
+        user_id = reg_response.json()["user"]["id"]
+        headers = {"Authorization": f"Bearer {reg_response.json()['access_token']}"}
+
+        for method, path in [
+            ("GET", "/api/admin/clients"),
+            ("PUT", f"/api/admin/clients/{user_id}/approve"),
+            ("PUT", f"/api/admin/clients/{user_id}/revoke"),
+            ("DELETE", f"/api/admin/clients/{user_id}"),
+            ("GET", "/api/admin/metrics"),
+        ]:
+            response = requests.request(method, f"{BASE_URL}{path}", headers=headers)
+            assert response.status_code == 403, f"{method} {path} answered {response.status_code}"
+
+        # The user was neither approved nor deleted
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": unique_email, "password": "testpass"})
+        assert response.status_code == 200
+        assert response.json()["user"]["is_approved"] is False
+
+        # An is_admin claim is only trusted with a valid signature
+        forged = jwt.encode(
+            {"sub": user_id, "email": unique_email, "is_admin": True, "exp": datetime.now(timezone.utc) + timedelta(hours=1)},
+            "not-the-server-secret", algorithm="HS256"
+        )
+        response = requests.get(f"{BASE_URL}/api/admin/clients", headers={"Authorization": f"Bearer {forged}"})
+        assert response.status_code == 401
+        print("✓ Client management rejected for user and forged admin tokens")
+
 
 class TestAdminServicesManagement:
     """Test admin service management endpoints"""
@@ -437,6 +774,29 @@ class TestAdminServicesManagement:
         assert data["name"] == original_name  # Name unchanged
         print(f"✓ Service updated - ID: {service_id}")
 
+    def test_service_changes_visible_immediately(self, admin_token):
+        """GET /api/services is served from the catalog cache, refreshed by every admin write"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        
+        response = requests.post(f"{BASE_URL}/api/admin/services",
+            json={"name": "TEST_Catalog", "duration_minutes": 30, "price": 10.0, "description": ""},
+            headers=headers
+        )
+        assert response.status_code == 200
+        service_id = response.json()["id"]
+        
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        assert any(s["id"] == service_id for s in services), "New service missing from the cached list"
+        
+        requests.put(f"{BASE_URL}/api/admin/services/{service_id}", json={"price": 12.0}, headers=headers)
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        assert next(s for s in services if s["id"] == service_id)["price"] == 12.0
+        
+        requests.delete(f"{BASE_URL}/api/admin/services/{service_id}", headers=headers)
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        assert not any(s["id"] == service_id for s in services), "Deleted service still in the cached list"
+        print(f"✓ Catalog cache refreshed by create, update and delete")
+
 
 class TestAdminHairdressersManagement:
     """Test admin hairdresser management endpoints"""
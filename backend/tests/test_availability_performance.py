@@ -0,0 +1,207 @@
+"""
+Backend Performance Tests for Availability:
+1. /availability/days-status issues a constant number of Mongo round trips
+2. /availability/first scans growing windows instead of one day at a time
+3. Availability results are cached and invalidated by writes
+
+Round trips are read from the X-DB-Round-Trips response header, which the
+backend only sends when started with DB_ROUND_TRIP_HEADER=true.
+"""
+import pytest
+import requests
+import os
+import time
+from datetime import datetime, timedelta
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@parrucco.it"
+ADMIN_PASSWORD = "admin123"
+
+
+def round_trips(response):
+    value = response.headers.get("X-DB-Round-Trips")
+    if value is None:
+        pytest.skip("Backend not started with DB_ROUND_TRIP_HEADER=true")
+    return int(value)
+
+
+class TestDaysStatusRoundTrips:
+    """The month engine must not issue per-day queries"""
+
+    @pytest.fixture
+    def service_and_hairdresser(self):
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+        assert len(services) > 0, "No services found"
+        assert len(hairdressers) > 0, "No hairdressers found"
+        return services[0], hairdressers[-1]
+
+    def test_round_trips_constant_as_range_grows(self, service_and_hairdresser):
+        """7, 31 and 93 day ranges must cost the same number of round trips"""
+        service, hairdresser = service_and_hairdresser
+        start = datetime.now()
+
+        costs = {}
+        for days in (7, 31, 93):
+            # Shift the window each time so the in-memory index has to load it
+            window_start = start + timedelta(days=days * 2)
+            started_at = time.perf_counter()
+            response = requests.post(f"{BASE_URL}/api/availability/days-status", json={
+                "service_id": service["id"],
+                "hairdresser_id": hairdresser["id"],
+                "start_date": window_start.strftime('%Y-%m-%d'),
+                "end_date": (window_start + timedelta(days=days - 1)).strftime('%Y-%m-%d')
+            })
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            assert response.status_code == 200
+            assert len(response.json()) == days
+            costs[days] = round_trips(response)
+            print(f"✓ {days} days: {costs[days]} round trips, {elapsed_ms:.1f} ms")
+
+        # A request may also pay the catalog version check (one find_one every CATALOG_CHECK_SECONDS)
+        assert max(costs.values()) - min(costs.values()) <= 1, f"Round trips grow with the range: {costs}"
+        assert costs[93] <= 6, f"Too many round trips for a range query: {costs}"
+
+    def test_past_days_are_closed(self, service_and_hairdresser):
+        """Days before today are always reported as closed"""
+        service, hairdresser = service_and_hairdresser
+        start = datetime.now() - timedelta(days=10)
+
+        response = requests.post(f"{BASE_URL}/api/availability/days-status", json={
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"],
+            "start_date": start.strftime('%Y-%m-%d'),
+            "end_date": (start + timedelta(days=8)).strftime('%Y-%m-%d')
+        })
+        assert response.status_code == 200
+
+        for day in response.json():
+            assert day["status"] == "closed", f"Past day {day['date']} should be closed: {day}"
+        print(f"✓ Past days reported as closed")
+
+    def test_range_and_hairdresser_validated(self, service_and_hairdresser):
+        """Ranges over a year get 400, unknown hairdressers get 404"""
+        service, hairdresser = service_and_hairdresser
+        start = datetime.now()
+
+        response = requests.post(f"{BASE_URL}/api/availability/days-status", json={
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"],
+            "start_date": start.strftime('%Y-%m-%d'),
+            "end_date": (start + timedelta(days=3650)).strftime('%Y-%m-%d')
+        })
+        assert response.status_code == 400
+
+        response = requests.post(f"{BASE_URL}/api/availability/days-status", json={
+            "service_id": service["id"],
+            "hairdresser_id": "unknown-hairdresser",
+            "start_date": start.strftime('%Y-%m-%d'),
+            "end_date": (start + timedelta(days=6)).strftime('%Y-%m-%d')
+        })
+        assert response.status_code == 404
+        print(f"✓ Oversized range and unknown hairdresser rejected")
+
+
+class TestFirstAvailableRangeScan:
+    """The first-available search must not cost one query per day"""
+
+    @pytest.fixture
+    def service_and_hairdresser(self):
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+        assert len(services) > 0, "No services found"
+        assert len(hairdressers) > 0, "No hairdressers found"
+        return services[0], hairdressers[0]
+
+    def test_search_up_to_one_year(self, service_and_hairdresser):
+        """days_to_search accepts a full year and answers with few round trips"""
+        service, hairdresser = service_and_hairdresser
+
+        response = requests.post(f"{BASE_URL}/api/availability/first", json={
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"],
+            "days_to_search": 366
+        })
+        assert response.status_code == 200
+        data = response.json()
+        if data["found"]:
+            assert data["date"] >= datetime.now().strftime('%Y-%m-%d')
+            assert data["time"] is not None
+        # One range query per window (7, 14, 30, 60, ...) plus settings and service
+        assert round_trips(response) <= 20, f"Too many round trips: {round_trips(response)}"
+        print(f"✓ First available within a year: {data}")
+
+    def test_search_longer_than_one_year_rejected(self, service_and_hairdresser):
+        service, hairdresser = service_and_hairdresser
+
+        response = requests.post(f"{BASE_URL}/api/availability/first", json={
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"],
+            "days_to_search": 1000
+        })
+        assert response.status_code == 422
+        print(f"✓ days_to_search above one year rejected")
+
+
+class TestAvailabilityCache:
+    """Repeated availability requests are served from the cache until a write"""
+
+    @pytest.fixture
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        assert response.status_code == 200, f"Admin login failed: {response.text}"
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def cache_stats(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/admin/metrics", headers=admin_headers)
+        assert response.status_code == 200
+        return response.json()["availability_cache"]
+
+    def test_cache_hit_and_invalidation(self, admin_headers):
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+
+        future_date = datetime.now() + timedelta(days=6)
+        while future_date.weekday() == 6:
+            future_date = future_date + timedelta(days=1)
+        availability_request = {
+            "date": future_date.strftime('%Y-%m-%d'),
+            "service_id": services[0]["id"],
+            "hairdresser_id": hairdressers[0]["id"]
+        }
+
+        first = requests.post(f"{BASE_URL}/api/availability", json=availability_request)
+        assert first.status_code == 200
+        before = self.cache_stats(admin_headers)
+
+        second = requests.post(f"{BASE_URL}/api/availability", json=availability_request)
+        assert second.json() == first.json()
+        after = self.cache_stats(admin_headers)
+        assert after["hits"] == before["hits"] + 1, f"Second identical request should hit the cache: {after}"
+        print(f"✓ Identical availability request served from cache")
+
+        slots = first.json()["available_slots"]
+        if not slots:
+            pytest.skip("No free slot to book on the test day")
+
+        # A manual booking must be visible immediately
+        hours, minutes = map(int, slots[0].split(':'))
+        booking = requests.post(f"{BASE_URL}/api/admin/appointments/manual", json={
+            "client_name": "Cache Test",
+            "client_phone": "+393330000000",
+            "service_id": services[0]["id"],
+            "hairdresser_id": hairdressers[0]["id"],
+            "date_time": future_date.replace(hour=hours, minute=minutes, second=0, microsecond=0).isoformat()
+        }, headers=admin_headers)
+        assert booking.status_code == 200, f"Manual booking failed: {booking.text}"
+
+        third = requests.post(f"{BASE_URL}/api/availability", json=availability_request)
+        assert slots[0] not in third.json()["available_slots"], "Cached availability not invalidated by the booking"
+        print(f"✓ Booking invalidated the cached availability")
+
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{booking.json()['id']}", headers=admin_headers)
@@ -0,0 +1,109 @@
+"""
+Backend Concurrency Tests:
+1. Simultaneous bookings of the same slot - exactly one succeeds
+2. Simultaneous overlapping bookings - no two appointments overlap
+3. A released slot (delete) can be booked again
+"""
+import pytest
+import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@parrucco.it"
+ADMIN_PASSWORD = "admin123"
+
+PARALLEL_REQUESTS = 20
+
+
+class TestConcurrentBooking:
+    """Two clients must never obtain overlapping appointments"""
+
+    @pytest.fixture
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        assert response.status_code == 200, f"Admin login failed: {response.text}"
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    @pytest.fixture
+    def booking_target(self):
+        services = requests.get(f"{BASE_URL}/api/services").json()
+        hairdressers = requests.get(f"{BASE_URL}/api/hairdressers").json()
+        assert len(services) > 0, "No services found"
+        assert len(hairdressers) > 0, "No hairdressers found"
+
+        # Far enough in the future not to collide with other tests
+        day = datetime.now() + timedelta(days=45)
+        while day.weekday() == 6:
+            day = day + timedelta(days=1)
+        return services[0], hairdressers[0], day.replace(hour=11, minute=0, second=0, microsecond=0)
+
+    def book(self, admin_headers, service, hairdresser, date_time, index):
+        return requests.post(f"{BASE_URL}/api/admin/appointments/manual", json={
+            "client_name": f"Concurrency Test {index}",
+            "client_phone": "+393330000000",
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"],
+            "date_time": date_time.isoformat()
+        }, headers=admin_headers)
+
+    def fire(self, admin_headers, service, hairdresser, times):
+        with ThreadPoolExecutor(max_workers=len(times)) as pool:
+            futures = [
+                pool.submit(self.book, admin_headers, service, hairdresser, date_time, index)
+                for index, date_time in enumerate(times)
+            ]
+            return [future.result() for future in futures]
+
+    def test_same_slot_booked_once(self, admin_headers, booking_target):
+        service, hairdresser, date_time = booking_target
+
+        responses = self.fire(admin_headers, service, hairdresser, [date_time] * PARALLEL_REQUESTS)
+        created = [r.json()["id"] for r in responses if r.status_code == 200]
+        rejected = [r for r in responses if r.status_code == 400]
+
+        try:
+            assert len(created) == 1, f"Expected exactly one booking, got {len(created)}"
+            assert len(rejected) == PARALLEL_REQUESTS - 1
+            print(f"✓ {PARALLEL_REQUESTS} simultaneous bookings, 1 accepted")
+        finally:
+            for appointment_id in created:
+                requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment_id}", headers=admin_headers)
+
+    def test_overlapping_slots_never_overlap(self, admin_headers, booking_target):
+        service, hairdresser, date_time = booking_target
+        duration = service["duration_minutes"]
+
+        # Start times every 5 minutes across two service durations
+        times = [date_time + timedelta(minutes=5 * i) for i in range(PARALLEL_REQUESTS)]
+        responses = self.fire(admin_headers, service, hairdresser, times)
+        created = [r.json() for r in responses if r.status_code == 200]
+
+        try:
+            assert len(created) >= 1
+            starts = sorted(datetime.fromisoformat(a["date_time"].replace('Z', '+00:00')) for a in created)
+            for previous, current in zip(starts, starts[1:]):
+                assert current - previous >= timedelta(minutes=duration), \
+                    f"Overlapping appointments at {previous} and {current}"
+            print(f"✓ {len(created)} of {PARALLEL_REQUESTS} overlapping bookings accepted, none overlap")
+        finally:
+            for appointment in created:
+                requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment['id']}", headers=admin_headers)
+
+    def test_deleted_slot_can_be_booked_again(self, admin_headers, booking_target):
+        service, hairdresser, date_time = booking_target
+
+        first = self.book(admin_headers, service, hairdresser, date_time, 0)
+        assert first.status_code == 200, f"Booking failed: {first.text}"
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{first.json()['id']}", headers=admin_headers)
+
+        second = self.book(admin_headers, service, hairdresser, date_time, 1)
+        assert second.status_code == 200, f"Released slot not bookable: {second.text}"
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{second.json()['id']}", headers=admin_headers)
+        print(f"✓ Deleted appointment released its slot")
@@ -0,0 +1,137 @@
+"""
+Backend Push Delivery Tests:
+1. A test notification reaches the push service (stub endpoint)
+2. An expired subscription (HTTP 410) is removed from the user
+3. A reminder is delivered when it becomes due, and only once
+
+These tests need the backend started with PUSH_STUB_ENABLED=true, so that
+subscriptions can point at the local stub push service /api/push/stub/<token>.
+"""
+import pytest
+import requests
+import os
+import time
+import uuid
+import base64
+from datetime import datetime, timedelta, timezone
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+ADMIN_EMAIL = "admin@parrucco.it"
+ADMIN_PASSWORD = "admin123"
+# The scheduler of another process notices new reminders within REMINDER_MAX_SLEEP_SECONDS
+REMINDER_WAIT_SECONDS = 65
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).decode().strip("=")
+
+
+def stub_subscription(token, status=None):
+    """Subscription with real browser-like keys pointing at the stub push service"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    endpoint = f"{BASE_URL}/api/push/stub/{token}"
+    if status:
+        endpoint += f"?status={status}"
+    return {"endpoint": endpoint, "keys": {"p256dh": b64(public_key), "auth": b64(os.urandom(16))}}
+
+
+class TestPushDelivery:
+    """Push notifications through the stub push service"""
+
+    @pytest.fixture
+    def admin_headers(self):
+        if requests.get(f"{BASE_URL}/api/push/stub/probe").status_code == 404:
+            pytest.skip("Backend not started with PUSH_STUB_ENABLED=true")
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        assert response.status_code == 200, f"Admin login failed: {response.text}"
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        yield headers
+        requests.delete(f"{BASE_URL}/api/push/unsubscribe", headers=headers)
+
+    @pytest.fixture
+    def reminder_soon(self, admin_headers):
+        """Stub subscription and an appointment whose 10 minute reminder is due in a few seconds"""
+        token = str(uuid.uuid4())
+        response = requests.post(f"{BASE_URL}/api/push/subscribe", json=stub_subscription(token), headers=admin_headers)
+        assert response.status_code == 200
+        preferences = requests.get(f"{BASE_URL}/api/user/notification-preferences", headers=admin_headers).json()
+        requests.put(f"{BASE_URL}/api/user/notification-preferences", json={"notification_preferences": ["10min"]}, headers=admin_headers)
+
+        service = requests.get(f"{BASE_URL}/api/services").json()[0]
+        hairdresser = requests.post(f"{BASE_URL}/api/admin/hairdressers",
+            json={"name": "TEST_Reminder_Hairdresser", "specialties": []},
+            headers=admin_headers
+        ).json()
+        response = requests.post(f"{BASE_URL}/api/appointments",
+            json={
+                "service_id": service["id"],
+                "hairdresser_id": hairdresser["id"],
+                "date_time": (datetime.now(timezone.utc) + timedelta(minutes=10, seconds=3)).isoformat()
+            },
+            headers=admin_headers
+        )
+        assert response.status_code == 200, f"Booking failed: {response.text}"
+        appointment = response.json()
+
+        yield token
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment['id']}", headers=admin_headers)
+        requests.delete(f"{BASE_URL}/api/admin/hairdressers/{hairdresser['id']}", headers=admin_headers)
+        requests.put(f"{BASE_URL}/api/user/notification-preferences", json=preferences, headers=admin_headers)
+
+    def wait_for_deliveries(self, token, count):
+        deadline = time.monotonic() + REMINDER_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            deliveries = requests.get(f"{BASE_URL}/api/push/stub/{token}").json()["deliveries"]
+            if deliveries >= count:
+                return deliveries
+            time.sleep(0.5)
+        return deliveries
+
+    def test_notification_delivered(self, admin_headers):
+        token = str(uuid.uuid4())
+        response = requests.post(f"{BASE_URL}/api/push/subscribe", json=stub_subscription(token), headers=admin_headers)
+        assert response.status_code == 200
+
+        response = requests.post(f"{BASE_URL}/api/push/test", headers=admin_headers)
+        assert response.status_code == 200, f"Test push failed: {response.text}"
+
+        deliveries = requests.get(f"{BASE_URL}/api/push/stub/{token}").json()["deliveries"]
+        assert deliveries == 1
+        print(f"✓ Test notification delivered to the push service")
+
+    def test_expired_subscription_pruned(self, admin_headers):
+        token = str(uuid.uuid4())
+        response = requests.post(f"{BASE_URL}/api/push/subscribe", json=stub_subscription(token, status=410), headers=admin_headers)
+        assert response.status_code == 200
+
+        response = requests.post(f"{BASE_URL}/api/push/test", headers=admin_headers)
+        assert response.status_code == 410
+
+        # The dead subscription is gone: nothing left to send to
+        response = requests.post(f"{BASE_URL}/api/push/test", headers=admin_headers)
+        assert response.status_code == 400
+        assert requests.get(f"{BASE_URL}/api/push/stub/{token}").json()["deliveries"] == 1
+        print(f"✓ Subscription answering 410 removed after the first failure")
+
+    def test_reminder_delivered_when_due(self, reminder_soon):
+        assert self.wait_for_deliveries(reminder_soon, 1) == 1, "Reminder not delivered"
+        print(f"✓ Reminder delivered when due")
+
+    def test_reminder_not_sent_twice(self, admin_headers, reminder_soon):
+        assert self.wait_for_deliveries(reminder_soon, 1) == 1, "Reminder not delivered"
+
+        # Saving the preferences again recreates the job, still within its lateness window
+        requests.put(f"{BASE_URL}/api/user/notification-preferences", json={"notification_preferences": ["10min"]}, headers=admin_headers)
+        time.sleep(5)
+        assert requests.get(f"{BASE_URL}/api/push/stub/{reminder_soon}").json()["deliveries"] == 1
+        print(f"✓ Reminder already recorded as sent is not delivered again")
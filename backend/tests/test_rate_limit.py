@@ -0,0 +1,67 @@
+"""
+Backend Rate Limit Tests:
+1. Clients forwarded by the ingress get separate buckets
+2. A forged X-Forwarded-For prefix does not change the bucket
+
+These tests run RateLimitMiddleware in-process in front of a stub app that
+always answers 401, since through a real proxy every request of the test
+machine comes from the same address. No backend or MongoDB is needed.
+"""
+import pytest
+import os
+import sys
+from pathlib import Path
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+# server.py reads its configuration at import time; nothing connects to Mongo here
+added_env = [name for name in ("MONGO_URL", "DB_NAME") if name not in os.environ]
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "rate_limit_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import server
+for name in added_env:
+    del os.environ[name]
+
+
+async def failed_login(scope, receive, send):
+    await JSONResponse({"detail": "Invalid email or password"}, status_code=401)(scope, receive, send)
+
+
+class TestForwardedClients:
+    """Buckets are keyed by the client address the ingress appends to X-Forwarded-For"""
+
+    @pytest.fixture
+    def limited_client(self, monkeypatch):
+        monkeypatch.setattr(server, "RATE_LIMIT_SHARED", False)
+        monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 1)
+        monkeypatch.setattr(server, "rate_limit_buckets", server.TokenBuckets(1000))
+        # Every request comes from the same peer, as from the ingress
+        return TestClient(server.RateLimitMiddleware(failed_login))
+
+    def login(self, client, forwarded_for, attempt):
+        return client.post("/api/auth/login",
+            json={"email": f"forwarded_{attempt}@test.com", "password": "wrongpassword"},
+            headers={"X-Forwarded-For": forwarded_for}
+        )
+
+    def exhaust(self, client, forwarded_for):
+        capacity = int(server.RATE_LIMIT_RULES["/api/auth/login"]["ip"].capacity)
+        statuses = [self.login(client, forwarded_for, attempt).status_code for attempt in range(capacity + 1)]
+        assert statuses[:-1] == [401] * capacity
+        assert statuses[-1] == 429
+
+    def test_forwarded_clients_get_separate_buckets(self, limited_client):
+        self.exhaust(limited_client, "203.0.113.10")
+
+        response = self.login(limited_client, "203.0.113.20", "other")
+        assert response.status_code == 401, "A second client shares the first one's bucket"
+        print("✓ Forwarded clients rate limited separately")
+
+    def test_forged_prefix_keeps_the_bucket(self, limited_client):
+        self.exhaust(limited_client, "203.0.113.30")
+
+        # The client controls what precedes the address appended by the ingress
+        response = self.login(limited_client, "198.51.100.7, 203.0.113.30", "forged")
+        assert response.status_code == 429
+        print("✓ Forged X-Forwarded-For entries ignored")
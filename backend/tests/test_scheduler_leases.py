@@ -0,0 +1,67 @@
+"""
+Backend Scheduler Lease Tests:
+1. Partitions left by a crashed worker are taken over by a live one
+2. A partition leased by another live worker is left alone
+
+These tests write to db.scheduler_leases directly, so they need MONGO_URL and
+DB_NAME of the backend and a running scheduler (API with RUN_SCHEDULERS=true
+or worker.py).
+"""
+import pytest
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_URL = os.environ.get('MONGO_URL', '')
+DB_NAME = os.environ.get('DB_NAME', '')
+
+NOTIFICATION_PARTITIONS = 16
+# A scheduler tick happens at least every SCHEDULER_LEASE_SECONDS / 3 (20 s by default)
+LEASE_WAIT_SECONDS = 30
+
+
+class TestLeaseTakeover:
+    """Notification partitions move between workers through Mongo leases"""
+
+    @pytest.fixture
+    def leases(self):
+        if not MONGO_URL or not DB_NAME:
+            pytest.skip("MONGO_URL and DB_NAME of the backend are not set")
+        client = MongoClient(MONGO_URL, tz_aware=True, serverSelectionTimeoutMS=3000)
+        try:
+            client.admin.command("ping")
+        except PyMongoError:
+            pytest.skip("MongoDB of the backend not reachable")
+        collection = client[DB_NAME].scheduler_leases
+        yield collection
+        collection.delete_many({"owner": {"$in": ["TEST_crashed_worker", "TEST_live_worker"]}})
+        client.close()
+
+    def test_expired_partitions_taken_over(self, leases):
+        now = datetime.now(timezone.utc)
+        for partition in range(NOTIFICATION_PARTITIONS):
+            # Partition 0 is still held by a live worker, the others expired with a crashed one
+            if partition == 0:
+                owner, expires_at = "TEST_live_worker", now + timedelta(seconds=LEASE_WAIT_SECONDS * 4)
+            else:
+                owner, expires_at = "TEST_crashed_worker", now - timedelta(seconds=1)
+            leases.update_one(
+                {"_id": f"notifications:{partition}"},
+                {"$set": {"kind": "notifications", "partition": partition, "owner": owner, "expires_at": expires_at}},
+                upsert=True
+            )
+
+        deadline = time.monotonic() + LEASE_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            if leases.count_documents({"owner": "TEST_crashed_worker"}) == 0:
+                break
+            time.sleep(1)
+        assert leases.count_documents({"owner": "TEST_crashed_worker"}) == 0, "Expired partitions not taken over"
+
+        live = leases.find_one({"_id": "notifications:0"})
+        assert live["owner"] == "TEST_live_worker", "A partition leased by a live worker was taken"
+        for lease in leases.find({"kind": "notifications", "partition": {"$ne": 0}}):
+            assert lease["expires_at"] > datetime.now(timezone.utc)
+        print(f"✓ {NOTIFICATION_PARTITIONS - 1} expired partitions taken over, live lease kept")
@@ -195,6 +195,107 @@ class TestSlotValidation:
         admin_headers = {"Authorization": f"Bearer {admin_token}"}
         requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment['id']}", headers=admin_headers)
 
+    def test_availability_follows_reschedule_and_delete(self, user1_token, service_and_hairdresser, admin_token):
+        """
+        Availability must reflect moves and deletions immediately (in-memory interval index)
+        """
+        service, hairdresser = service_and_hairdresser
+
+        future_date = datetime.now() + timedelta(days=5)
+        while future_date.weekday() == 6:
+            future_date = future_date + timedelta(days=1)
+
+        date_str = future_date.strftime('%Y-%m-%d')
+        availability_request = {
+            "date": date_str,
+            "service_id": service["id"],
+            "hairdresser_id": hairdresser["id"]
+        }
+
+        headers = {"Authorization": f"Bearer {user1_token}"}
+        book_response = requests.post(f"{BASE_URL}/api/appointments",
+            json={
+                "service_id": service["id"],
+                "hairdresser_id": hairdresser["id"],
+                "date_time": future_date.replace(hour=14, minute=0, second=0, microsecond=0).isoformat()
+            },
+            headers=headers
+        )
+
+        if book_response.status_code != 200:
+            pytest.skip(f"Could not book appointment: {book_response.text}")
+
+        appointment = book_response.json()
+
+        # Move the appointment to 16:00
+        new_time = future_date.replace(hour=16, minute=0, second=0, microsecond=0)
+        move_response = requests.patch(
+            f"{BASE_URL}/api/appointments/{appointment['id']}/reschedule",
+            params={"new_date_time": new_time.isoformat()},
+            headers=headers
+        )
+        assert move_response.status_code == 200, f"Reschedule failed: {move_response.text}"
+
+        slots = requests.post(f"{BASE_URL}/api/availability", json=availability_request).json()["available_slots"]
+        assert "14:00" in slots, f"14:00 should be free again after the move! Available: {slots}"
+        assert "16:00" not in slots, f"16:00 should be taken after the move! Available: {slots}"
+        print(f"✓ Availability follows the reschedule")
+
+        # Delete it: 16:00 must be free again
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        requests.delete(f"{BASE_URL}/api/admin/appointments/{appointment['id']}", headers=admin_headers)
+
+        slots = requests.post(f"{BASE_URL}/api/availability", json=availability_request).json()["available_slots"]
+        assert "16:00" in slots, f"16:00 should be free after deletion! Available: {slots}"
+        print(f"✓ Availability follows the deletion")
+
+    def test_deleted_service_keeps_booked_duration(self, admin_token):
+        """
+        Overlaps use the duration stored on the appointment, not the service's current one
+        """
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        service = requests.post(f"{BASE_URL}/api/admin/services",
+            json={"name": "TEST_Long_Service", "duration_minutes": 90, "price": 80.0, "description": ""},
+            headers=admin_headers
+        ).json()
+        hairdresser = requests.post(f"{BASE_URL}/api/admin/hairdressers",
+            json={"name": "TEST_Duration_Hairdresser", "specialties": []},
+            headers=admin_headers
+        ).json()
+        other_service = requests.get(f"{BASE_URL}/api/services").json()[0]
+
+        future_date = datetime.now() + timedelta(days=6)
+        while future_date.weekday() == 6:
+            future_date = future_date + timedelta(days=1)
+        start = future_date.replace(hour=10, minute=0, second=0, microsecond=0)
+
+        book_response = requests.post(f"{BASE_URL}/api/appointments",
+            json={"service_id": service["id"], "hairdresser_id": hairdresser["id"], "date_time": start.isoformat()},
+            headers=admin_headers
+        )
+        assert book_response.status_code == 200, f"Booking failed: {book_response.text}"
+        appointment = book_response.json()
+
+        # Without the service, the 10:00-11:30 appointment must still block 11:00
+        requests.delete(f"{BASE_URL}/api/admin/services/{service['id']}", headers=admin_headers)
+        overlapping = requests.post(f"{BASE_URL}/api/appointments",
+            json={"service_id": other_service["id"], "hairdresser_id": hairdresser["id"], "date_time": start.replace(hour=11).isoformat()},
+            headers=admin_headers
+        )
+        assert overlapping.status_code == 400, f"11:00 overlaps the 90 minute booking! Got {overlapping.status_code}: {overlapping.text}"
+
+        after = requests.post(f"{BASE_URL}/api/appointments",
+            json={"service_id": other_service["id"], "hairdresser_id": hairdresser["id"], "date_time": start.replace(hour=11, minute=30).isoformat()},
+            headers=admin_headers
+        )
+        assert after.status_code == 200, f"11:30 should be free: {after.text}"
+        print(f"✓ Deleted service: the booking keeps its 90 minutes")
+
+        # Cleanup
+        for apt in (appointment, after.json()):
+            requests.delete(f"{BASE_URL}/api/admin/appointments/{apt['id']}", headers=admin_headers)
+        requests.delete(f"{BASE_URL}/api/admin/hairdressers/{hairdresser['id']}", headers=admin_headers)
+
 
 class TestAdminReschedule:
     """Test admin can reschedule (move) appointments"""
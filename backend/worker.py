@@ -0,0 +1,63 @@
+"""
+Standalone worker for the background jobs (reminders, push delivery, cleanup).
+
+Run it next to API processes started with RUN_SCHEDULERS=false:
+
+    python -m backend.worker        (from the repository root)
+    python worker.py                (from backend/)
+
+It exposes its own health check on WORKER_HEALTH_PORT (GET /health).
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+# The API module lives next to this file and is imported as a top-level module,
+# as uvicorn does with server:app
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import server
+
+WORKER_HEALTH_PORT = int(os.environ.get('WORKER_HEALTH_PORT', '8002'))
+
+
+async def health(request):
+    status = server.background_jobs_health()
+    status["mongo"] = await server.mongo_healthy()
+    healthy = status["mongo"] and all(job["healthy"] for job in status["jobs"].values())
+    status["status"] = "ok" if healthy else "error"
+    return web.json_response(status, status=200 if healthy else 503)
+
+
+async def main():
+    await server.run_migrations()
+    await server.ensure_indexes()
+
+    tasks = server.start_background_jobs()
+
+    health_app = web.Application()
+    health_app.router.add_get("/health", health)
+    runner = web.AppRunner(health_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", WORKER_HEALTH_PORT).start()
+    logging.info(f"Worker {server.WORKER_ID} started, health check on port {WORKER_HEALTH_PORT}")
+
+    # Stop on SIGTERM/SIGINT, releasing the leases so other workers take over right away
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logging.info(f"Worker {server.WORKER_ID} stopping")
+    await runner.cleanup()
+    await server.stop_background_jobs(tasks)
+    server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
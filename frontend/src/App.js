@@ -80,6 +80,8 @@ function App() {
   };
 
   const logout = () => {
+    // Revoca il token lato server (non blocca il logout locale)
+    axios.post('/auth/logout').catch(() => {});
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     setUser(null);
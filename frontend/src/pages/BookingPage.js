@@ -56,22 +56,19 @@ const BookingPage = ({ user, logout }) => {
 
   const fetchData = async () => {
     try {
-      const [servicesRes, hairdressersRes, settingsRes] = await Promise.all([
-        axios.get('/services'),
-        axios.get('/hairdressers'),
-        axios.get('/settings')
-      ]);
-      setServices(servicesRes.data);
-      setHairdressers(hairdressersRes.data);
-      setTimeSlots(settingsRes.data.time_slots || [
+      // Servizi, parrucchieri e impostazioni in una sola richiesta
+      const { data } = await axios.get('/bootstrap');
+      setServices(data.services);
+      setHairdressers(data.hairdressers);
+      setTimeSlots(data.settings.time_slots || [
         '09:00', '09:30', '10:00', '10:30', '11:00', '11:30',
         '14:00', '14:30', '15:00', '15:30', '16:00', '16:30',
         '17:00', '17:30', '18:00'
       ]);
-      setWorkingDays(settingsRes.data.working_days || [1, 2, 3, 4, 5, 6]);
+      setWorkingDays(data.settings.working_days || [1, 2, 3, 4, 5, 6]);
       setCalendarLimit({
-        type: settingsRes.data.calendar_limit_type || 'always',
-        value: settingsRes.data.calendar_limit_value || 0
+        type: data.settings.calendar_limit_type || 'always',
+        value: data.settings.calendar_limit_value || 0
       });
     } catch (error) {
       toast.error('Errore nel caricamento dei dati');